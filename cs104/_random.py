@@ -0,0 +1,32 @@
+"""
+Random number helpers shared by the simulations, html_interact, and
+animate, so that their results can be made reproducible.
+"""
+
+import numpy as np
+
+
+def _rng(seed=None):
+    """
+    Return a np.random.Generator for seed, which may be None, an int, a
+    np.random.SeedSequence, or a Generator (which is returned as is).
+
+    With no seed, the generator is seeded from np.random so that calling
+    np.random.seed beforehand still makes the results reproducible.
+    """
+    if seed is None:
+        seed = np.random.randint(2**32, size=4, dtype=np.uint32)
+    return np.random.default_rng(seed)
+
+
+def _seed_sequence(seed=None):
+    """
+    Return a np.random.SeedSequence for seed, which may be any of the
+    values accepted by _rng.
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    elif seed is None or isinstance(seed, np.random.Generator):
+        return np.random.SeedSequence(_rng(seed).integers(2**32, size=4))
+    else:
+        return np.random.SeedSequence(seed)
@@ -0,0 +1,371 @@
+"""
+Helpers shared by html_interact and animate: encoding plots as images,
+writing them to the images directory, the manifest of the images in use,
+and the cache of rendered results that persists across notebook runs.
+"""
+
+from contextlib import contextmanager
+from numbers import Integral
+import functools
+import hashlib
+import io
+import json
+import os
+import pickle
+import re
+import sys
+import sysconfig
+import time
+import types
+
+import datascience
+import matplotlib
+import numpy as np
+import PIL
+from datascience import Table
+from PIL import Image
+
+from .version import __version__
+
+
+# The image formats plots can be saved in, and their file extensions.
+_IMAGE_FORMATS = {"png": "png", "webp": "webp", "jpeg": "jpg"}
+
+
+def _check_image_format(format):
+    if format not in _IMAGE_FORMATS:
+        raise ValueError(
+            "Image format must be one of {}, not {}".format(
+                ", ".join(_IMAGE_FORMATS), repr(format)
+            )
+        )
+
+
+def _encode_image(rgba, format="png", quality=None):
+    """
+    Encode an RGBA pixel buffer, like an Agg canvas's, as an image in the
+    given format.  The quality is the zlib compression level (0-9) for PNG
+    images, or the quality (0-100) for WebP and JPEG images.
+    """
+    image = Image.fromarray(np.asarray(rgba))
+    encoded = io.BytesIO()
+    if format == "png":
+        level = 6 if quality is None else quality
+        image.save(encoded, format="png", compress_level=level)
+    elif format == "webp":
+        quality = 80 if quality is None else quality
+        image.save(encoded, format="webp", quality=quality)
+    else:
+        quality = 90 if quality is None else quality
+        image.convert("RGB").save(encoded, format="jpeg", quality=quality)
+    return encoded.getvalue()
+
+
+def _worker_count(workers):
+    """
+    The number of processes to use for the workers argument, which may be
+    None or "auto" for one per core.
+    """
+    if workers is None or workers == "auto":
+        return os.cpu_count() or 1
+    return workers
+
+
+def _save_file(data, kind, extension):
+    """
+    Write the bytes to the images directory and return the file name.
+    The name comes from a hash of the bytes, so it only changes when the
+    data does, and identical files are only written once.
+    """
+    digest = hashlib.sha256(data).hexdigest()[:20]
+
+    os.makedirs("images", exist_ok=True)
+    prefix = os.getenv("LECTURE_NAME", "ex")
+    filename = f"images/{prefix}-{kind}-{digest}.{extension}"
+
+    if not os.path.exists(filename):
+        with open(filename, "wb") as f:
+            f.write(data)
+    return filename
+
+
+def _save_image(image, format="png"):
+    """
+    Write the image bytes to the images directory and return the file name.
+    """
+    return _save_file(image, "image", _IMAGE_FORMATS[format])
+
+
+_MANIFEST = os.path.join("images", "manifest.json")
+_MANIFEST_LOCK = _MANIFEST + ".lock"
+
+# A lock older than this was left behind by a process that died holding it.
+_STALE_LOCK_SECONDS = 60
+
+# The names of the images, bundles, and data files html_interact writes, and
+# the videos animate writes, now and in older versions.
+_IMAGE_NAME = re.compile(
+    r".+-(image-(i_\d+|[0-9a-f]{20})\.(png|webp|jpg)|bundle-[0-9a-f]{20}\.bin"
+    r"|data-[0-9a-f]{20}\.json(\.gz)?|video-[0-9a-f]{20}\.(mp4|webp))"
+)
+
+
+def _read_manifest():
+    try:
+        with open(_MANIFEST) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(manifest):
+    os.makedirs("images", exist_ok=True)
+    temp = f"{_MANIFEST}.{os.getpid()}"
+    with open(temp, "w") as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(temp, _MANIFEST)
+
+
+@contextmanager
+def _manifest_lock():
+    """
+    Hold a lock file while the manifest is read and rewritten, so notebooks
+    run at the same time (eg: by nbconvert in parallel) don't lose each
+    other's updates.
+    """
+    os.makedirs("images", exist_ok=True)
+    while True:
+        try:
+            os.close(os.open(_MANIFEST_LOCK, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(_MANIFEST_LOCK) > _STALE_LOCK_SECONDS:
+                    os.remove(_MANIFEST_LOCK)
+            except FileNotFoundError:
+                pass
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.remove(_MANIFEST_LOCK)
+
+
+@contextmanager
+def _updating_manifest():
+    """
+    Lock the manifest and yield it as a dict from file names to the times
+    they were last used.  Changes to the dict are written back afterwards.
+    """
+    with _manifest_lock():
+        manifest = _read_manifest()
+        yield manifest
+        _write_manifest(manifest)
+
+
+def _record_images(filenames):
+    """
+    Note in the manifest that the images were just used.
+    """
+    now = time.time()
+    with _updating_manifest() as manifest:
+        for filename in filenames:
+            manifest[filename] = now
+
+
+######################################################################
+# A cache of rendered results that persists across notebook runs.
+######################################################################
+
+_CACHE_DIR = os.path.join("images", ".cache")
+
+# The oldest cache entries are removed when the cache grows past this size.
+_CACHE_MAX_BYTES = 256 * 2**20
+
+
+class _Uncacheable(Exception):
+    """Raised when a value has no stable fingerprint."""
+
+
+def _is_library_function(f):
+    """
+    True if the function f comes from cs104, the standard library, or an
+    installed package, rather than a notebook or the user's own modules.
+    """
+    module = sys.modules.get(getattr(f, "__module__", None) or "")
+    if module is None:
+        return False
+    if module.__name__.partition(".")[0] == __name__.partition(".")[0]:
+        return True
+    filename = getattr(module, "__file__", None)
+    if filename is None:
+        return False
+    filename = os.path.realpath(filename)
+    return any(
+        filename.startswith(os.path.realpath(sysconfig.get_path(path)) + os.sep)
+        for path in ("stdlib", "platstdlib", "purelib", "platlib")
+    )
+
+
+def _fingerprint(h, v, seen):
+    """
+    Update the hash h with a description of the value v that changes
+    whenever v would.  Functions are described by their code, defaults,
+    closures, and the global variables they refer to, so editing a function
+    or the data it uses changes its fingerprint.  Library functions are
+    described by their names, since their state (eg: caches) isn't data a
+    plot depends on.  Objects with a _cache_description method (eg:
+    controls) are described by what it returns.  Raises _Uncacheable for
+    values we can't describe.
+
+    seen maps the ids of the values already described to the values, which
+    keeps them alive so their ids aren't reused by temporary values.
+    """
+    h.update(type(v).__qualname__.encode())
+
+    if v is None or isinstance(v, (bool, Integral, float, complex, str, bytes)):
+        h.update(repr(v).encode())
+    elif isinstance(v, (np.generic, np.ndarray)) and v.dtype != object:
+        h.update(str((v.dtype, v.shape)).encode())
+        h.update(np.ascontiguousarray(v).tobytes())
+    elif isinstance(v, (types.ModuleType, type)):
+        h.update(getattr(v, "__qualname__", v.__name__).encode())
+    elif isinstance(v, types.FunctionType) and _is_library_function(v):
+        h.update(f"{v.__module__}.{v.__qualname__}".encode())
+    elif id(v) in seen:
+        h.update(b"<seen>")
+    else:
+        seen[id(v)] = v
+        if isinstance(v, Table):
+            _fingerprint(h, (v.labels, v.columns), seen)
+        elif isinstance(v, np.ndarray):
+            _fingerprint(h, (v.shape, v.tolist()), seen)
+        elif isinstance(v, (list, tuple)):
+            for x in v:
+                _fingerprint(h, x, seen)
+        elif isinstance(v, (set, frozenset)):
+            _fingerprint(h, sorted(v, key=repr), seen)
+        elif isinstance(v, dict):
+            _fingerprint(h, list(v.items()), seen)
+        elif isinstance(v, types.CodeType):
+            h.update(v.co_code)
+            _fingerprint(h, (v.co_consts, v.co_names), seen)
+        elif isinstance(v, types.FunctionType):
+            _fingerprint(h, (v.__code__, v.__defaults__, v.__kwdefaults__), seen)
+            if v.__closure__:
+                _fingerprint(h, [c.cell_contents for c in v.__closure__], seen)
+            _fingerprint(h, _global_references(v), seen)
+        elif isinstance(v, types.MethodType):
+            _fingerprint(h, (v.__func__, v.__self__), seen)
+        elif isinstance(v, functools.partial):
+            _fingerprint(h, (v.func, v.args, v.keywords), seen)
+        elif hasattr(v, "_cache_description"):
+            _fingerprint(h, v._cache_description(), seen)
+        else:
+            try:
+                h.update(pickle.dumps(v))
+            except Exception:
+                raise _Uncacheable()
+
+
+def _environment():
+    """
+    A description of what changes how results look besides the function
+    and its data: matplotlib's settings and the versions of the libraries
+    that draw them.
+    """
+    # Plots are always drawn with Agg, whatever the backend.
+    settings = [k for k in sorted(matplotlib.rcParams) if k != "backend"]
+    return (
+        [(k, repr(matplotlib.rcParams[k])) for k in settings],
+        [
+            __version__,
+            datascience.__version__,
+            matplotlib.__version__,
+            np.__version__,
+            PIL.__version__,
+        ],
+    )
+
+
+def _global_references(f):
+    """
+    The global variables used by function f's code, or by any functions
+    nested within it, as a sorted list of (name, value) pairs.
+    """
+    names = set()
+    codes = [f.__code__]
+    while codes:
+        code = codes.pop()
+        names.update(code.co_names)
+        codes.extend(c for c in code.co_consts if isinstance(c, types.CodeType))
+    return sorted((name, f.__globals__[name]) for name in names if name in f.__globals__)
+
+
+def _cache_get(key):
+    """
+    Return the rendered output cached under key, or None.
+    """
+    filename = os.path.join(_CACHE_DIR, key)
+    try:
+        with open(filename, "rb") as file:
+            header, _, data = file.read().partition(b"\n")
+        offset = 0
+
+        def decode(v):
+            nonlocal offset
+            if isinstance(v, dict):
+                offset += v["bytes"]
+                return data[offset - v["bytes"] : offset]
+            elif isinstance(v, list):
+                return tuple(decode(x) for x in v)
+            else:
+                return v
+
+        rendered = decode(json.loads(header))
+        os.utime(filename)  # mark it as recently used
+        return rendered
+    except Exception:
+        return None
+
+
+def _cache_put(key, rendered):
+    """
+    Save the rendered output under key.  The output may be bytes, or a
+    tuple of strings, numbers, and bytes.  It is written as a line of JSON
+    describing it, followed by the bytes it holds, since the images
+    directory may be published and pickles aren't safe to load.
+    """
+    data = []
+
+    def encode(v):
+        if isinstance(v, bytes):
+            data.append(v)
+            return {"bytes": len(v)}
+        elif isinstance(v, tuple):
+            return [encode(x) for x in v]
+        else:
+            return v
+
+    header = json.dumps(encode(rendered)).encode()
+    os.makedirs(_CACHE_DIR, exist_ok=True)
+    with open(os.path.join(_CACHE_DIR, key), "wb") as file:
+        file.write(header + b"\n" + b"".join(data))
+
+
+def _cache_evict():
+    """
+    Remove the least recently used entries until the cache is under
+    _CACHE_MAX_BYTES.
+    """
+    try:
+        entries = [entry for entry in os.scandir(_CACHE_DIR) if entry.is_file()]
+    except FileNotFoundError:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    total = sum(entry.stat().st_size for entry in entries)
+    for entry in entries:
+        if total <= _CACHE_MAX_BYTES:
+            break
+        total -= entry.stat().st_size
+        os.remove(entry.path)
@@ -1,19 +1,443 @@
 __all__ = ["animate"]
 
 
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+import base64
+import hashlib
 import inspect
+import io
+import itertools
+import multiprocessing
 import numbers
+import os
+import shutil
+import subprocess
+import tempfile
+import uuid
+import warnings
 
 import numpy as np
 from datascience import Figure
 from IPython.display import HTML, display
 from matplotlib import pyplot as plots
-from matplotlib.animation import FuncAnimation
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.offsetbox import AnchoredText
+from PIL import Image, TiffImagePlugin, features
+
+from ._random import _seed_sequence
+from ._render import (
+    _CACHE_DIR,
+    _Uncacheable,
+    _cache_evict,
+    _cache_get,
+    _cache_put,
+    _check_image_format,
+    _encode_image,
+    _environment,
+    _fingerprint,
+    _record_images,
+    _save_file,
+    _save_image,
+    _worker_count,
+)
+from .player import DISPLAY_TEMPLATE, JS_INCLUDE, STYLE_INCLUDE
+
+
+def _frame_sequence(gen):
+    """
+    The frames for gen, which is a generator function or an iterable.
+    """
+    return gen() if callable(gen) else gen
+
+
+def _caption_box(ax, caption):
+    at = AnchoredText(caption, loc="upper center", prop=dict(size=16), frameon=True)
+    at.set_zorder(60)
+    ax.add_artist(at)
+    at.patch.set_boxstyle("round,pad=0.,rounding_size=0.2")
+    at.patch.set_facecolor("yellow")
+    return at
+
+
+def _params_box(ax, text):
+    at = AnchoredText(
+        text,
+        loc="upper left",
+        prop=dict(size=10, fontfamily="sans-serif"),
+        frameon=True,
+        bbox_to_anchor=(1.025, 0.75),
+        bbox_transform=ax.transAxes,
+    )
+    ax.add_artist(at)
+    at.patch.set_boxstyle("round,pad=0.,rounding_size=0.2")
+    at.patch.set_facecolor("wheat")
+    return at
+
+
+def _axes_signature(fig):
+    """
+    What the static parts of the figure's axes look like: where they are,
+    their limits, ticks, and labels.
+    """
+    return [
+        (
+            ax.get_position().bounds,
+            ax.get_xlim(),
+            ax.get_ylim(),
+            tuple(ax.get_xticks()),
+            tuple(ax.get_yticks()),
+            ax.get_title(),
+            ax.get_xlabel(),
+            ax.get_ylabel(),
+        )
+        for ax in fig.axes
+    ]
+
+
+class _Blitter:
+    """
+    Draws frames by redrawing only the artists that change.  The artists
+    a frame's call to f creates, the ones it returns, and the caption and
+    parameter boxes are drawn over a saved background holding everything
+    else.  The background is redrawn whenever the axes' limits, ticks, or
+    labels change.
+    """
+
+    def __init__(self, fig):
+        self.fig = fig
+        self.canvas = FigureCanvasAgg(fig)
+        self.background = None
+        self.signature = None
+        self.transient = []
+        self.boxes = {}
+
+    def remove_transient(self):
+        for artist in self.transient:
+            try:
+                artist.remove()
+            except (ValueError, NotImplementedError):
+                pass  # f already removed it, or it can't be removed
+        self.transient = []
+
+        # Forget the removed artists' data when autoscaling, and restart
+        #   the color cycle, as clearing the axes would.
+        for ax in self.fig.axes:
+            ax.relim()
+            ax.set_prop_cycle(None)
+
+    def children(self):
+        return {id(a): a for ax in self.fig.axes for a in ax.get_children()}
+
+    def box(self, name, ax, text, make):
+        """
+        Reuse the box from the last frame if it is on the same axes,
+        changing only its text.
+        """
+        at = self.boxes.get(name)
+        if at is None or at.axes is not ax or at not in ax.get_children():
+            if at is not None and at in at.axes.get_children():
+                at.remove()
+            at = make(ax, text)
+            self.boxes[name] = at
+        else:
+            at.txt.set_text(text)
+        at.set_visible(True)
+        return at
+
+    def hide_box(self, name):
+        if name in self.boxes:
+            self.boxes[name].set_visible(False)
+
+    def draw(self, before, returned):
+        """
+        Draw the frame, given the children of the axes before f was called
+        and the artists f returned, and return the RGBA buffer.
+        """
+        if returned is None:
+            returned = []
+        elif not isinstance(returned, (list, tuple)):
+            returned = [returned]
+        returned = [a for a in returned if hasattr(a, "set_animated")]
+
+        created = [a for k, a in self.children().items() if k not in before]
+        boxes = [at for at in self.boxes.values() if at.get_visible()]
+        dynamic = list({id(a): a for a in created + returned + boxes}.values())
+        self.transient = [
+            a for a in created if all(a is not b for b in returned + boxes)
+        ]
+
+        # Spines are drawn over the plots, so they are left out of the
+        #   background too.
+        spines = [spine for ax in self.fig.axes for spine in ax.spines.values()]
+        for artist in dynamic + spines:
+            artist.set_animated(True)
+
+        signature = _axes_signature(self.fig)
+        if self.background is None or signature != self.signature:
+            self.canvas.draw()
+            self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+            self.signature = signature
+        else:
+            self.canvas.restore_region(self.background)
+
+        # Draw with our canvas's renderer rather than fig.draw_artist, which
+        #   uses fig.canvas.  pyplot replaces that if f, or the Figure,
+        #   makes the figure current.
+        renderer = self.canvas.get_renderer()
+
+        for artist in sorted(dynamic + spines, key=lambda a: a.get_zorder()):
+            artist.draw(renderer)
+        return self.canvas.buffer_rgba()
+
+
+# The function drawing chunks of frames for the current parallel render.
+# Worker processes are forked after this is set, so they inherit it, and
+# their own copy of the figure, without pickling.
+_parallel_frames = None
+
+
+# How many frames to read from gen at a time.
+_FRAME_BATCH = 100
+
+# How many frames a worker process draws at a time.  This doesn't depend on
+# the number of workers, so neither do the frames.
+_FRAMES_PER_CHUNK = 8
+
+
+def _render_chunk(indices, seed_sequence):
+    # The forked workers all start with the same np.random state.
+    np.random.seed(seed_sequence.generate_state(4))
+    return list(_parallel_frames(indices))
+
+
+def _animation_hash(f, settings):
+    """
+    A hash of f and the settings its frames are drawn with, to start each
+    frame's key from.  Returns None if they can't be fingerprinted.
+    """
+    h = hashlib.sha256(b"animate")
+    try:
+        _fingerprint(h, (f, settings, _environment()), {})
+        return h
+    except (_Uncacheable, RecursionError, ValueError):
+        # ValueError: a closure refers to a variable that isn't set yet.
+        return None
+
+
+def _frame_keys(h, frames):
+    """
+    A hash for each frame of h, from _animation_hash, and the frame's
+    parameters, so frames that will look the same have the same key.
+    Returns None if they can't be fingerprinted.
+    """
+    if h is None:
+        return None
+    try:
+        keys = []
+        for args in frames:
+            frame = h.copy()
+            _fingerprint(frame, args, {})
+            keys.append(frame.hexdigest())
+        return keys
+    except (_Uncacheable, RecursionError, ValueError):
+        return None
+
+
+def _render_frames(render, indices, workers=1):
+    """
+    Yield the encoded frames with the given indices, in order.
+    render(indices) yields the encoded frames for a list of indices.
+    Contiguous chunks of them are shared among `workers` processes, and
+    only a few chunks are in flight at once.  Each chunk seeds np.random
+    from its own stream spawned from np.random's state, so the processes
+    don't repeat each other's random numbers.
+    """
+    global _parallel_frames
+
+    chunks = [
+        indices[i : i + _FRAMES_PER_CHUNK]
+        for i in range(0, len(indices), _FRAMES_PER_CHUNK)
+    ]
+    workers = min(_worker_count(workers), len(chunks))
+
+    # Forking lets workers run functions defined in a notebook, which we
+    #   could not pickle.  Without it, render everything here.
+    if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        yield from render(indices)
+        return
+
+    chunks = zip(chunks, _seed_sequence().spawn(len(chunks)))
+    previous_frames = _parallel_frames
+    _parallel_frames = render
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            pending = deque(
+                executor.submit(_render_chunk, *chunk)
+                for chunk in itertools.islice(chunks, 2 * workers)
+            )
+            while pending:
+                frames = pending.popleft().result()
+                for chunk in itertools.islice(chunks, 1):
+                    pending.append(executor.submit(_render_chunk, *chunk))
+                yield from frames
+    finally:
+        _parallel_frames = previous_frames
+
+
+def _jshtml(frames, frame_format, interval, default_mode, external, max_bytes):
+    """
+    The html for matplotlib's javascript player showing the encoded frames,
+    the number of frames in it, and the sizes of the images it includes.
+    frames yields the index of the first frame that looks the same as each
+    one, and its image.
+    Repeated frames refer to the first one's image rather than including
+    it again.  If external is True, the images are written to the images
+    directory rather than included in the html.  Frames past max_bytes of
+    images are dropped.
+    """
+    mime = "svg+xml" if frame_format == "svg" else frame_format
+    fill_frames = ["\n"]
+    sizes = []
+    filenames = []
+    for i, (first, frame) in enumerate(frames):
+        if first != i:
+            fill_frames.append(f"  frames[{i}] = frames[{first}]\n")
+            continue
+
+        if external:
+            size = len(frame)
+        else:
+            src = f"data:image/{mime};base64,{base64.b64encode(frame).decode()}"
+            size = len(src)
+
+        if max_bytes is not None and sum(sizes) + size > max_bytes:
+            warnings.warn(
+                f"The animation's images have reached the limit of {max_bytes} "
+                f"bytes, so it stops after {i} frames.  Pass a larger max_bytes "
+                "to animate to include more."
+            )
+            break
+        if external:
+            src = _save_image(frame, frame_format)
+            filenames.append(src)
+        sizes.append(size)
+        fill_frames.append(f'  frames[{i}] = "{src}"\n')
+
+    if filenames:
+        _record_images(filenames)
+
+    mode_dict = dict(once_checked="", loop_checked="", reflect_checked="")
+    mode_dict[default_mode + "_checked"] = "checked"
+
+    html = JS_INCLUDE + STYLE_INCLUDE + DISPLAY_TEMPLATE.format(
+        id=uuid.uuid4().hex,
+        Nframes=len(fill_frames) - 1,
+        fill_frames="".join(fill_frames),
+        interval=interval,
+        **mode_dict,
+    )
+    return html, len(fill_frames) - 1, sizes
+
+
+def _video(frames, interval, quality=None):
+    """
+    Encode the stream of frames, as yielded for _jshtml, as a video.
+    Returns the video's MIME type and bytes: an MP4 if ffmpeg is
+    installed, and an animated WebP of the given quality otherwise.
+    """
+    frames = (frame for _, frame in frames)
+    ffmpeg = shutil.which(plots.rcParams["animation.ffmpeg_path"])
+    if ffmpeg is None:
+        return "image/webp", _webp_video(frames, interval, quality)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "video.mp4")
+        encoder = subprocess.Popen(
+            [ffmpeg, "-loglevel", "error", "-f", "image2pipe"]
+            + ["-framerate", str(1000 / interval), "-i", "-"]
+            + ["-c:v", "libx264", "-pix_fmt", "yuv420p"]
+            + ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-y", filename],
+            stdin=subprocess.PIPE,
+        )
+        try:
+            for frame in frames:
+                encoder.stdin.write(frame)
+        finally:
+            encoder.stdin.close()
+            if encoder.wait() != 0:
+                raise RuntimeError("ffmpeg could not encode the animation")
+        with open(filename, "rb") as video:
+            return "video/mp4", video.read()
+
+
+def _webp_video(frames, interval, quality=None):
+    """
+    Encode the frames as an animated WebP of the given quality.  Pillow
+    reads every frame passed to it as append_images before encoding, so
+    the frames are written to a multi-page TIFF first.  Pillow reads a
+    TIFF a page at a time as it encodes, so only one frame is decoded at
+    once.
+    """
+    compression = "tiff_adobe_deflate" if features.check("libtiff") else None
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "frames.tiff")
+        with open(filename, "w+b") as file:
+            with TiffImagePlugin.AppendingTiffWriter(file) as tiff:
+                for frame in frames:
+                    with Image.open(io.BytesIO(frame)) as image:
+                        image.save(tiff, format="tiff", compression=compression)
+                    tiff.newFrame()
+
+        video = io.BytesIO()
+        with Image.open(filename) as images:
+            images.save(
+                video,
+                format="webp",
+                save_all=True,
+                duration=interval,
+                loop=0,
+                quality=80 if quality is None else quality,
+            )
+        return video.getvalue()
+
+
+def _video_html(mime, video, default_mode, external):
+    """
+    The html showing the video, and the name of the file it was written to
+    if external is True.
+    """
+    if external:
+        src = _save_file(video, "video", mime.split("/")[1])
+        _record_images([src])
+    else:
+        src = f"data:{mime};base64,{base64.b64encode(video).decode()}"
+
+    if mime.startswith("image/"):
+        return f'<img src="{src}"/>'
+    loop = "" if default_mode == "once" else " loop"
+    return f'<video controls autoplay muted{loop} src="{src}"></video>'
 
 
 def animate(
-    f, gen, interval=100, default_mode=None, fig=None, show_params=True, **kwargs
+    f,
+    gen,
+    interval=100,
+    default_mode=None,
+    fig=None,
+    show_params=True,
+    seed=0,
+    frame_format="png",
+    blit=False,
+    workers=1,
+    video=False,
+    cache=False,
+    external=False,
+    max_bytes=None,
+    frame_quality=None,
+    **kwargs,
 ):
     """
     Animate a series of calls to the function f.  That function should create
@@ -28,18 +452,116 @@ def animate(
     * fig: pass in a matplot lib Figure if you do not want the function to create
         a new figure for the animation.
     * show_params: Show the parameters to f in a box to the side of the figure.
+    * seed: np.random is seeded with this value before drawing each frame,
+        so that frames using random numbers are reproducible.  Use None to
+        leave np.random alone.
+    * frame_format: the image format for frames, "png", "webp", or "jpeg".
+        WebP and JPEG frames are smaller, but lossy.
+    * frame_quality: the quality of WebP and JPEG frames, from 0 to 100, or
+        the compression level of PNG frames, from 0 to 9.  WebP's quality is
+        also used for animated WebP videos.
+    * blit: only redraw what changes from frame to frame.  The axes are not
+        cleared between frames.  Instead, the plot elements f creates are
+        removed before the next frame, and those f returns are kept, so f may
+        update them in place rather than creating new ones.  The axes, ticks,
+        and labels are drawn once and reused until they change.  Every
+        frame is drawn, in order, in this process, so workers and cache
+        don't apply, and repeated frames are drawn again.
+    * workers: the number of processes to draw frames in, or None or
+        "auto" for one per core.  Each process draws its own copy of the
+        figure.  Extra processes are forked, which Windows can't do and
+        macOS does unreliably, so leave this at 1 there.  With more than
+        one, gen is read to the end before any frames are drawn.
+    * video: encode the frames as a video instead of showing them in a
+        player with controls: an MP4 if ffmpeg is installed, and an
+        animated WebP otherwise.
+    * cache: save frames in the images/.cache directory, and reuse the ones
+        saved by earlier runs when f, its data, matplotlib's settings, and
+        the libraries have not changed.  This requires fig to be None, and
+        is off by default.  Frames with the
+        same parameters are only drawn once either way, unless seed is None.
+    * external: write the frames, or the video, to files in the images
+        directory and show a player that refers to them, rather than
+        including them in the notebook.  This keeps the notebook small.
+        The sizes of the frames written are printed.
+    * max_bytes: the most bytes of images to include.  Frames past the
+        limit are dropped, with a warning, and with one worker gen is not
+        read past them, so it may go on forever if its frames differ.  A
+        video over the limit is an error, and needs a gen that ends.  The
+        default is matplotlib's animation.embed_limit for frames included
+        in the notebook, and no limit for external ones.
     * **kwargs: Any additional kwargs are pass to the constructor for Figure.
         Requires fig to be None.
     """
 
+    _check_image_format(frame_format)
+    if max_bytes is None and not external:
+        max_bytes = int(plots.rcParams["animation.embed_limit"] * 2**20)
+    if default_mode is None:
+        default_mode = "loop"
+    default_mode = {"repeat": "loop", "rewind": "reflect"}.get(
+        default_mode.lower(), default_mode.lower()
+    )
+
     kwargs = kwargs.copy()
     kwargs.setdefault("figsize", (8, 5))
 
+    fig_is_new = fig is None
     if fig is None:
         fig = Figure(**kwargs)
 
     parameter_names = inspect.signature(f).parameters.keys()
 
+    def call(parameters):
+        if seed is None:
+            return f(**parameters)
+        else:
+            # make sort-of deterministic, without disturbing the caller's
+            #   random numbers...
+            state = np.random.get_state()
+            try:
+                np.random.seed(seed)
+                return f(**parameters)
+            finally:
+                np.random.set_state(state)
+
+    def params_text(parameters):
+        if hasattr(f, "__name__"):
+            name = f.__name__
+        else:
+            name = f.func.__name__
+            parameters["..."] = "..."
+
+        def r(v):
+            if isinstance(v, numbers.Number):
+                s = str(round(v, 4))
+            elif isinstance(v, (str, bool)):
+                s = repr(v)
+            elif issubclass(type(v), object):
+                s = "..."
+            elif callable(v):
+                if hasattr(v, "__name__"):
+                    s = v.__name__
+                else:
+                    s = repr(v)
+            else:
+                s = repr(v)
+            if len(s) > 16:
+                s = s[0:13] + "..."
+            return s
+
+        return (
+            f"{name}({' ' * (50 - len(name))}\n  "
+            + f",\n  ".join(
+                [
+                    f"{key} = {r(parameters[key])}"
+                    for key in parameter_names
+                    if not key.startswith("_")
+                ]
+            )
+            + "\n)"
+        )
+
     def one_frame(args):
         for ax in fig.axes():
             ax.clear()
@@ -47,78 +569,189 @@ def animate(
         with fig:
 
             parameters = {k: args[k] for k in parameter_names}
+            call(parameters)
 
-            np.random.seed(0)  # make sort-of deterministic...
+            ax = fig.axes()[-1]
 
-            f(**parameters)
+            if "_caption" in args and args["_caption"] != "":
+                _caption_box(ax, args["_caption"])
+
+            if show_params:
+                _params_box(ax, params_text(parameters))
+
+    def blit_frame(blitter, args):
+        if blitter.background is None:
+            for ax in fig.axes():
+                ax.clear()
+        else:
+            blitter.remove_transient()
+
+        with fig:
+            before = blitter.children()
+
+            parameters = {k: args[k] for k in parameter_names}
+            returned = call(parameters)
 
             ax = fig.axes()[-1]
 
             if "_caption" in args and args["_caption"] != "":
-                caption = args["_caption"]
-                at = AnchoredText(
-                    caption, loc="upper center", prop=dict(size=16), frameon=True
-                )
-                at.set_zorder(60)
-                ax.add_artist(at)
-                at.patch.set_boxstyle("round,pad=0.,rounding_size=0.2")
-                at.patch.set_facecolor("yellow")
+                blitter.box("caption", ax, args["_caption"], _caption_box)
+            else:
+                blitter.hide_box("caption")
 
             if show_params:
-                if hasattr(f, "__name__"):
-                    name = f.__name__
-                else:
-                    name = f.func.__name__
-                    parameters["..."] = "..."
-
-                def r(v):
-                    if isinstance(v, numbers.Number):
-                        s = str(round(v, 4))
-                    elif isinstance(v, (str, bool)):
-                        s = repr(v)
-                    elif issubclass(type(v), object):
-                        s = "..."
-                    elif callable(v):
-                        if hasattr(v, "__name__"):
-                            s = v.__name__
-                        else:
-                            s = repr(v)
-                    else:
-                        s = repr(v)
-                    if len(s) > 16:
-                        s = s[0:13] + "..."
-                    return s
-
-                arg_values = (
-                    f"{name}({' ' * (50 - len(name))}\n  "
-                    + f",\n  ".join(
-                        [
-                            f"{key} = {r(parameters[key])}"
-                            for key in parameter_names
-                            if not key.startswith("_")
-                        ]
-                    )
-                    + "\n)"
-                )
-                at = AnchoredText(
-                    arg_values,
-                    loc="upper left",
-                    prop=dict(size=10, fontfamily="sans-serif"),
-                    frameon=True,
-                    bbox_to_anchor=(1.025, 0.75),
-                    bbox_transform=ax.transAxes,
-                )
-                ax.add_artist(at)
-                at.patch.set_boxstyle("round,pad=0.,rounding_size=0.2")
-                at.patch.set_facecolor("wheat")
+                blitter.box("params", ax, params_text(parameters), _params_box)
 
-    anim = FuncAnimation(fig.fig, func=one_frame, frames=gen, interval=interval)
+        return blitter.draw(before, returned)
 
     if show_params:
         fig.fig.tight_layout(pad=2, rect=[0, 0, 0.75, 1])
     else:
         fig.fig.tight_layout(pad=2)
-    video = anim.to_jshtml(default_mode=default_mode)
+
+    # The parameters of the batch of frames being drawn, by index.  Each is
+    #   copied, since gen may yield the same dict every time (eg: `yield
+    #   locals()`).
+    frames = {}
+    num_frames = 0
+    first = {}  # the index of the first frame with each key
+
+    # One blitter draws every frame, so the artists f returns are kept
+    #   from each frame to the next.
+    blitter = _Blitter(fig.fig) if blit else None
+
+    # Worker processes are forked with a copy of the frames' parameters, so
+    #   with several of them, all of gen is read first and they are only
+    #   forked once.
+    workers = 1 if blit else _worker_count(workers)
+    if "fork" not in multiprocessing.get_all_start_methods():
+        workers = 1
+    batch_size = _FRAME_BATCH if workers == 1 else None
+
+    def render(indices):
+        if blit:
+            for i in indices:
+                image = blit_frame(blitter, frames[i])
+                yield _encode_image(image, frame_format, frame_quality)
+        else:
+            canvas = FigureCanvasAgg(fig.fig)
+            for i in indices:
+                one_frame(frames[i])
+                canvas.draw()
+                yield _encode_image(canvas.buffer_rgba(), frame_format, frame_quality)
+
+    def stream():
+        """
+        Yield the index of the first frame that looks the same as each
+        frame, and the frame's image.  gen is read a batch at a time, so
+        we stop reading it when whoever is using the frames stops, and
+        only hold one batch's parameters.  Only a video needs repeated
+        frames' images.  Those are kept until their last repeat in the
+        batch, and read from the cache or drawn again in later batches.
+        """
+        nonlocal num_frames
+
+        # f is hashed once, before any frames are drawn, in case drawing them
+        #   changes something f refers to.  When blitting, f may update
+        #   what it drew last time, so every frame is drawn, in order.
+        h = None
+        if seed is not None and not blit:
+            settings = (show_params, seed, frame_format, frame_quality, blit, kwargs)
+            h = _animation_hash(f, settings)
+
+        source = iter(_frame_sequence(gen))
+        while True:
+            batch = [dict(args) for args in itertools.islice(source, batch_size)]
+            if not batch:
+                return
+            start = num_frames
+            num_frames += len(batch)
+            frames.clear()
+            frames.update(enumerate(batch, start))
+
+            # Frames that look the same share a key, and only the first of
+            #   them is drawn.  Without keys, every frame is different.
+            keys = _frame_keys(h, batch)
+            cached = cache and keys is not None and fig_is_new
+            if keys is None:
+                keys = [("frame", i) for i in range(start, num_frames)]
+
+            new = []
+            for i, key in enumerate(keys, start):
+                if key not in first:
+                    first[key] = i
+                    new.append(i)
+            missing = [
+                i
+                for i in new
+                if not (
+                    cached
+                    and os.path.exists(os.path.join(_CACHE_DIR, keys[i - start]))
+                )
+            ]
+            rendered = _render_frames(render, missing, workers)
+            drawn = set(missing)
+
+            remaining = Counter(keys)
+            kept = {}
+            for i, key in enumerate(keys, start):
+                if first[key] != i and not video:
+                    yield first[key], None
+                    continue
+
+                if key in kept:
+                    frame = kept[key]
+                elif i in drawn:
+                    frame = next(rendered)
+                    if cached:
+                        _cache_put(key, frame)
+                else:
+                    # Cached, or a repeat of a frame from an earlier batch.
+                    frame = _cache_get(key) if cached else None
+                    if frame is None:
+                        frame = next(render([i]))
+
+                # Keep the frame only until the last frame that repeats it.
+                remaining[key] -= 1
+                if video and remaining[key] > 0:
+                    kept[key] = frame
+                else:
+                    kept.pop(key, None)
+                yield first[key], frame
+
+    encoded = stream()
+    try:
+        if video:
+            quality = frame_quality if frame_format == "webp" else None
+            mime, data = _video(encoded, interval, quality)
+            if max_bytes is not None and len(data) > max_bytes:
+                plots.close(fig.fig)
+                raise ValueError(
+                    "The video is {} bytes, over the limit of {}.  Pass a larger "
+                    "max_bytes.".format(len(data), max_bytes)
+                )
+            html = _video_html(mime, data, default_mode, external)
+            count, sizes = num_frames, [len(data)]
+        else:
+            html, count, sizes = _jshtml(
+                encoded, frame_format, interval, default_mode, external, max_bytes
+            )
+    finally:
+        encoded.close()
+
+    if external:
+        if video:
+            what = "a {} KB video".format(round(sizes[0] / 1024))
+        else:
+            what = "{} distinct frames, {} KB ({} KB largest)".format(
+                len(sizes),
+                round(sum(sizes) / 1024),
+                round(max(sizes, default=0) / 1024),
+            )
+        print("animate: {} frames as {} in images/".format(count, what))
+
+    if cache and seed is not None and fig_is_new and not blit:
+        _cache_evict()
 
     plots.close(fig.fig)
-    display(HTML(video))
+    display(HTML(html))
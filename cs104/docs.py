@@ -141,6 +141,7 @@ def _wrapper(tag, fn_name, func):
     wrapper = call
     wrapper.__name__ = fn_name
     wrapper.__doc__ = func.__doc__
+    wrapper.__wrapped__ = func
     return wrapper
 
 
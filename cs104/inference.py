@@ -12,6 +12,9 @@ __all__ = [
     "simulate",
     "simulate_sample_statistic",
     "empirical_pvalue",
+    "NullDistribution",
+    "StreamingStatistics",
+    "PValueStoppingRule",
     "permutation_sample",
     "abs_difference_of_means",
     "simulate_permutation_statistic",
@@ -21,36 +24,368 @@ __all__ = [
     "line_predictions",
     "mean_squared_error",
     "linear_regression",
+    "fit_lines",
+    "bootstrap_regression",
     "residuals",
     "r2_score",
     "plot_scatter_with_line",
     "plot_residuals",
     "plot_regression_and_residuals",
     "plot_regression_line_and_mse_heat",
+    "clear_column_cache",
 ]
 
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import inspect
+import math
+import multiprocessing
+import weakref
+
 from datascience import *
 import numpy as np
 import matplotlib.pyplot as plots
 import matplotlib.colors as colors
 
+from ._random import _rng, _seed_sequence
 from .docs import doc_tag
 
 ###
 
+# The most random indices (eg: for resamples or permutations) we keep in
+# memory at once when running many trials in one batch.
+_MAX_BATCH_ELEMENTS = 2**22
+
+
+def _collect_outcomes(make_one_outcome, num_trials):
+    """
+    Call make_one_outcome() num_trials times and return all of the outcomes
+    flattened into a single array, exactly as repeatedly calling np.append
+    would, but without copying the whole array on every trial.
+
+    The first outcome determines the size and type of a buffer big enough
+    for every trial.  If a later outcome needs a wider type, the buffer is
+    converted once.  If a later outcome has a different size, we give up on
+    the buffer and concatenate the pieces at the end instead.
+    """
+    num_trials = int(num_trials)
+    if num_trials <= 0:
+        return make_array()
+
+    first = np.ravel(make_one_outcome())
+    width = first.size
+    buffer = np.empty(num_trials * width, dtype=np.result_type(make_array(), first))
+    buffer[0:width] = first
+
+    for i in range(1, num_trials):
+        outcome = np.ravel(make_one_outcome())
+        if outcome.size != width:
+            # Ragged outcomes: keep the trials so far and fall back to
+            # collecting pieces, converting each one to the type np.append
+            # would have produced at that point.
+            pieces = [buffer[0 : i * width]]
+            dtype = buffer.dtype
+            for j in range(i, num_trials):
+                if j > i:
+                    outcome = np.ravel(make_one_outcome())
+                dtype = np.result_type(dtype, outcome)
+                pieces.append(outcome.astype(dtype))
+            return np.concatenate(pieces)
+
+        dtype = np.result_type(buffer, outcome)
+        if dtype != buffer.dtype:
+            buffer = buffer.astype(dtype)
+        buffer[i * width : (i + 1) * width] = outcome
+
+    return buffer
+
+
+# When a seed or several workers are requested, trials are run in blocks of
+# this many trials, each with its own random stream.  The blocks never depend
+# on the number of workers, so neither do the results.
+_TRIALS_PER_BLOCK = 1000
+
+# The block function for the current parallel run.  Worker processes are
+# forked after this is set, so they inherit it without pickling.
+_parallel_run_block = None
+
+
+def _run_seeded_block(run_block, num_trials, seed_sequence, seed_np_random):
+    """
+    Call run_block(num_trials, rng) with a Generator for seed_sequence.
+    If seed_np_random is True, also seed np.random from seed_sequence for
+    the duration of the call, for the benefit of functions passed to us
+    that use np.random directly.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    if not seed_np_random:
+        return run_block(num_trials, rng)
+
+    state = np.random.get_state()
+    try:
+        np.random.seed(seed_sequence.generate_state(4))
+        return run_block(num_trials, rng)
+    finally:
+        np.random.set_state(state)
+
+
+def _run_parallel_block(num_trials, seed_sequence, seed_np_random):
+    return _run_seeded_block(
+        _parallel_run_block, num_trials, seed_sequence, seed_np_random
+    )
+
+
+def _trial_blocks(
+    run_block, num_trials, seed=None, workers=1, seed_np_random=False, blocks=False
+):
+    """
+    Generate arrays holding the outcomes of num_trials trials, in order,
+    where run_block(k, rng) returns an array with the outcomes of k trials,
+    drawing any random numbers it needs from the Generator rng.
+
+    With no seed and one worker, this just produces run_block(num_trials,
+    _rng()), or the same trials in blocks of _TRIALS_PER_BLOCK if blocks is
+    True.  If seed_np_random is also True, rng is None instead, so that
+    np.random is left exactly as the caller's functions expect.
+
+    Otherwise the trials are always split into blocks seeded by independent
+    streams spawned from _seed_sequence(seed).  The blocks are shared among
+    `workers` processes and produced in order, so a given seed produces the
+    same outcomes for any number of workers.  Set seed_np_random when
+    run_block calls functions that use np.random.
+    """
+    global _parallel_run_block
+
+    num_trials = int(num_trials)
+    block_sizes = [
+        min(_TRIALS_PER_BLOCK, num_trials - start)
+        for start in range(0, num_trials, _TRIALS_PER_BLOCK)
+    ]
+
+    if seed is None and workers == 1:
+        # Making a Generator draws from np.random, which would change the
+        #   outcomes of functions that use np.random after np.random.seed.
+        rng = None if seed_np_random else _rng()
+        if not blocks:
+            yield run_block(num_trials, rng)
+        else:
+            for k in block_sizes:
+                yield run_block(k, rng)
+        return
+
+    seed_sequences = _seed_sequence(seed).spawn(len(block_sizes))
+    seed_np_randoms = [seed_np_random] * len(block_sizes)
+
+    # Forking lets workers run functions defined in a notebook, which we
+    #   could not pickle.  Without it, we get the same results serially.
+    if (
+        workers > 1
+        and len(block_sizes) > 1
+        and "fork" in multiprocessing.get_all_start_methods()
+    ):
+        previous_run_block = _parallel_run_block
+        _parallel_run_block = run_block
+        executor = ProcessPoolExecutor(
+            max_workers=min(workers, len(block_sizes)),
+            mp_context=multiprocessing.get_context("fork"),
+        )
+        try:
+            yield from executor.map(
+                _run_parallel_block, block_sizes, seed_sequences, seed_np_randoms
+            )
+        finally:
+            # If our caller stops early, don't wait for the remaining blocks.
+            executor.shutdown(cancel_futures=True)
+            _parallel_run_block = previous_run_block
+    else:
+        for k, seed_sequence in zip(block_sizes, seed_sequences):
+            yield _run_seeded_block(run_block, k, seed_sequence, seed_np_random)
+
+
+def _run_trials(
+    run_block,
+    num_trials,
+    seed=None,
+    workers=1,
+    seed_np_random=False,
+    summary=None,
+    stopping_rule=None,
+):
+    """
+    Run the trials described by the arguments to _trial_blocks and return
+    an array of all of their outcomes.  If summary is given, add the
+    outcomes to it block by block instead, and return it.  If stopping_rule
+    is given, it sees each block as it is produced, and we stop running
+    trials once it is done.
+    """
+    blocks = summary is not None or stopping_rule is not None
+    outcomes = [make_array()]
+    trial_blocks = _trial_blocks(
+        run_block, num_trials, seed, workers, seed_np_random, blocks
+    )
+    try:
+        for block in trial_blocks:
+            if summary is None:
+                outcomes.append(block)
+            else:
+                summary.add(block)
+            if stopping_rule is not None:
+                stopping_rule.add(block)
+                if stopping_rule.done:
+                    break
+    finally:
+        trial_blocks.close()
+
+    if summary is None:
+        if len(outcomes) == 2:
+            # Don't copy the only block, but make it an array of floats
+            #   as np.append would.
+            return outcomes[1].astype(
+                np.result_type(outcomes[0], outcomes[1]), copy=False
+            )
+        return np.concatenate(outcomes)
+    else:
+        return summary
+
+
+class PValueStoppingRule:
+    """
+    A rule for stopping a simulation of a null distribution early, once
+    the empirical p-value for an observed statistic is known precisely
+    enough.  Pass one as the `stopping_rule` argument to simulate,
+    simulate_sample_statistic, or simulate_permutation_statistic.  Trials
+    are run in blocks of 1000, and the simulation stops after the first
+    block where the rule is satisfied, or after num_trials trials.  Example:
+
+    rule = PValueStoppingRule(observed_statistic, tolerance=0.005)
+    null_statistics = simulate_permutation_statistic(table, 'Group', 'Value', 100000, stopping_rule=rule)
+    rule.num_trials, rule.pvalue
+
+    The returned array only holds the trials that were actually run.
+    """
+
+    def __init__(
+        self, observed_statistic, tolerance=0.005, alpha=None, alternative="greater"
+    ):
+        """
+        * observed_statistic: the statistic to compute the p-value for.
+
+        * tolerance: stop once the standard error of the p-value is at
+                     most this much.
+
+        * alpha: (optional) also stop once the p-value is clearly above or
+                 below this significance level, meaning at least three
+                 standard errors away from it.
+
+        * alternative: "greater", "less", or "two-sided", as for
+                       NullDistribution.pvalue.
+        """
+        if alternative not in ("greater", "less", "two-sided"):
+            raise ValueError(
+                'The alternative must be "greater", "less", or "two-sided", '
+                "not {}".format(repr(alternative))
+            )
+        self.observed_statistic = observed_statistic
+        self.tolerance = tolerance
+        self.alpha = alpha
+        self.alternative = alternative
+        self.num_trials = 0
+        self._num_at_least = 0
+        self._num_at_most = 0
+
+    def add(self, statistics):
+        """
+        Count the statistics from another block of trials.
+        """
+        statistics = np.ravel(statistics)
+        self.num_trials += len(statistics)
+        self._num_at_least += np.count_nonzero(statistics >= self.observed_statistic)
+        self._num_at_most += np.count_nonzero(statistics <= self.observed_statistic)
+
+    @property
+    def pvalue(self):
+        """
+        The p-value from the trials so far.
+        """
+        if self.num_trials == 0:
+            return np.nan
+        greater = self._num_at_least / self.num_trials
+        less = self._num_at_most / self.num_trials
+        if self.alternative == "greater":
+            return greater
+        elif self.alternative == "less":
+            return less
+        else:
+            return min(1, 2 * min(greater, less))
+
+    @property
+    def standard_error(self):
+        """
+        The Monte Carlo standard error of the p-value from the trials so
+        far.  It is computed from (count + 1) / (num_trials + 2) rather than
+        the p-value itself, so it is never zero just because no extreme
+        statistics have been seen yet.
+        """
+        p = min(1, (self.pvalue * self.num_trials + 1) / (self.num_trials + 2))
+        return np.sqrt(p * (1 - p) / max(1, self.num_trials))
+
+    @property
+    def done(self):
+        """
+        True once the p-value is precise enough to stop.
+        """
+        if self.num_trials == 0:
+            return False
+        standard_error = self.standard_error
+        if standard_error <= self.tolerance:
+            return True
+        return self.alpha is not None and (
+            abs(self.pvalue - self.alpha) >= 3 * standard_error
+        )
+
 
 @doc_tag(path="inference-library-ref.html")
-def simulate(make_one_outcome, num_trials):
+def simulate(
+    make_one_outcome,
+    num_trials,
+    seed=None,
+    workers=1,
+    summary=None,
+    stopping_rule=None,
+):
     """
     Return an array of num_trials values, each
     of which was created by calling make_one_outcome().
+
+    Optional arguments:
+
+    * seed: an int, np.random.SeedSequence, or np.random.Generator used
+            to seed np.random for the trials so that the results are
+            reproducible.
+
+    * workers: the number of processes to run the trials in.  The
+               same seed gives the same results for any number of workers.
+
+    * summary: a StreamingStatistics to add the values to as they are
+               created.  The summary is returned instead of an array.
+
+    * stopping_rule: a PValueStoppingRule that may stop the trials before
+                     all num_trials have been run.
     """
-    outcomes = make_array()
-    for i in np.arange(0, num_trials):
-        outcome = make_one_outcome()
-        outcomes = np.append(outcomes, outcome)
 
-    return outcomes
+    def run_block(k, rng):
+        return _collect_outcomes(make_one_outcome, k)
+
+    return _run_trials(
+        run_block,
+        num_trials,
+        seed,
+        workers,
+        seed_np_random=True,
+        summary=summary,
+        stopping_rule=stopping_rule,
+    )
 
 
 # @doc_tag(path='inference-library-ref.html')
@@ -68,7 +403,14 @@ def simulate(make_one_outcome, num_trials):
 
 @doc_tag(path="inference-library-ref.html")
 def simulate_sample_statistic(
-    make_one_sample, sample_size, compute_sample_statistic, num_trials
+    make_one_sample,
+    sample_size,
+    compute_sample_statistic,
+    num_trials,
+    seed=None,
+    workers=1,
+    summary=None,
+    stopping_rule=None,
 ):
     """
     Simulates `num_trials` sampling steps and returns an array of the
@@ -84,14 +426,39 @@ def simulate_sample_statistic(
                          The return value should be a single numerical value.
 
     * num_trials: the number of simulation steps to perform.
+
+    * seed: (optional) an int, np.random.SeedSequence, or
+            np.random.Generator used to seed np.random for the simulation
+            so that the results are reproducible.
+
+    * workers: (optional) the number of processes to run the simulation
+               in.  The same seed gives the same results for any number
+               of workers.
+
+    * summary: (optional) a StreamingStatistics to add the statistics to
+               as they are computed.  The summary is returned instead of
+               an array.
+
+    * stopping_rule: (optional) a PValueStoppingRule that may stop the
+                     simulation before all num_trials steps have been run.
     """
 
-    simulated_statistics = make_array()
-    for i in np.arange(0, num_trials):
+    def one_statistic():
         simulated_sample = make_one_sample(sample_size)
-        sample_statistic = compute_sample_statistic(simulated_sample)
-        simulated_statistics = np.append(simulated_statistics, sample_statistic)
-    return simulated_statistics
+        return compute_sample_statistic(simulated_sample)
+
+    def run_block(k, rng):
+        return _collect_outcomes(one_statistic, k)
+
+    return _run_trials(
+        run_block,
+        num_trials,
+        seed,
+        workers,
+        seed_np_random=True,
+        summary=summary,
+        stopping_rule=stopping_rule,
+    )
 
 
 @doc_tag(path="inference-library-ref.html")
@@ -99,25 +466,108 @@ def empirical_pvalue(null_statistics, observed_statistic):
     """
     Return the proportion of the null statistics that are greater than
     or equal to the observed statistic.
+
+    If observed_statistic is an array, return an array with the p-value
+    for each of its values.  The null statistics may also be a
+    NullDistribution or StreamingStatistics.
     """
+    if isinstance(null_statistics, (NullDistribution, StreamingStatistics)):
+        return null_statistics.pvalue(observed_statistic)
+    if np.shape(observed_statistic) != ():
+        return NullDistribution(null_statistics).pvalue(observed_statistic)
+
     return np.count_nonzero(null_statistics >= observed_statistic) / len(
         null_statistics
     )
 
 
+class NullDistribution:
+    """
+    An array of simulated statistics, sorted once so that many p-values
+    and confidence intervals can be computed from it quickly.  Example:
+
+    null = NullDistribution(simulate_permutation_statistic(...))
+    null.pvalue(observed_statistic)
+    null.pvalue(make_array(0.1, 0.2, 0.3))
+    null.confidence_interval(95)
+    """
+
+    def __init__(self, statistics):
+        self._sorted = np.sort(np.ravel(statistics))
+        self._num_statistics = len(self._sorted)
+        # nan sorts to the end, and is never >= or <= anything.
+        self._statistics = self._sorted[~np.isnan(self._sorted)]
+
+    def __len__(self):
+        return self._num_statistics
+
+    def pvalue(self, observed_statistic, alternative="greater"):
+        """
+        Return the proportion of the statistics that are at least as extreme
+        as observed_statistic, which may be a single value or an array.
+
+        * alternative: "greater" (the default) counts the statistics greater
+                       than or equal to the observed statistic, as
+                       empirical_pvalue does.  "less" counts those less than
+                       or equal to it, and "two-sided" doubles the smaller
+                       of the two proportions.
+        """
+        observed_statistic = np.asarray(observed_statistic, dtype=float)
+        if alternative == "greater":
+            count = len(self._statistics) - np.searchsorted(
+                self._statistics, observed_statistic, side="left"
+            )
+        elif alternative == "less":
+            count = np.searchsorted(self._statistics, observed_statistic, side="right")
+            count = np.where(np.isnan(observed_statistic), 0, count)
+        elif alternative == "two-sided":
+            greater = self.pvalue(observed_statistic, "greater")
+            less = self.pvalue(observed_statistic, "less")
+            return np.minimum(1, 2 * np.minimum(greater, less))
+        else:
+            raise ValueError(
+                'The alternative must be "greater", "less", or "two-sided", '
+                "not {}".format(repr(alternative))
+            )
+        return count / self._num_statistics
+
+    def percentile(self, p):
+        """
+        Return the pth percentile of the statistics, as the datascience
+        percentile function would.
+        """
+        if p == 0:
+            return self._sorted[0]
+        i = math.ceil((p / 100) * self._num_statistics) - 1
+        return self._sorted[i]
+
+    def confidence_interval(self, ci_percent):
+        """
+        Return an array with the lower and upper bound of the ci_percent
+        confidence interval, as confidence_interval would.
+        """
+        percent_in_each_tail = (100 - ci_percent) / 2
+        left = self.percentile(percent_in_each_tail)
+        right = self.percentile(100 - percent_in_each_tail)
+        return make_array(left, right)
+
+
 ###
 
 
 @doc_tag(path="inference-library-ref.html")
-def permutation_sample(table, group_label):
+def permutation_sample(table, group_label, seed=None):
     """
     Takes a table and the label of a column used to group rows.
     Returns a copy of the table with a new "Shuffled Label" column
     containing the shuffled values from the group column.
+
+    The optional seed may be an int, np.random.SeedSequence, or
+    np.random.Generator used to make the shuffle reproducible.
     """
 
     # array of shuffled labels
-    shuffled_labels = table.sample(with_replacement=False).column(group_label)
+    shuffled_labels = _rng(seed).permutation(table.column(group_label))
 
     # table of numerical variable and shuffled labels
     shuffled_table = table.with_column("Shuffled Label", shuffled_labels)
@@ -125,6 +575,19 @@ def permutation_sample(table, group_label):
     return shuffled_table
 
 
+def _check_column_exists(table, label):
+    """
+    Raise the same error as table.column would if label is not a column
+    of the table.  This is the check from table.column -- it is ugly.
+    Refactor at some point...
+    """
+    if label not in table.labels:
+        raise ValueError(
+            'The column "{}" is not in the table. The table contains '
+            "these columns: {}".format(label, ", ".join(table.labels))
+        )
+
+
 def abs_difference_of_means(table, group_label, value_label):
     """
     Takes a table, the label of the column used to divide rows into
@@ -136,13 +599,7 @@ def abs_difference_of_means(table, group_label, value_label):
 
     # Check taht value_label exists so we don't get an error
     # about the mean column not existing later on...
-    # This is the check from table.column -- it is ugly.  Refactor
-    # at some point...
-    if value_label not in table.labels:
-        raise ValueError(
-            'The column "{}" is not in the table. The table contains '
-            "these columns: {}".format(value_label, ", ".join(table.labels))
-        )
+    _check_column_exists(table, value_label)
 
     # table containing group means
     means_table = table.group(group_label, np.mean)
@@ -154,7 +611,16 @@ def abs_difference_of_means(table, group_label, value_label):
 
 
 @doc_tag(path="inference-library-ref.html")
-def simulate_permutation_statistic(table, group_label, value_label, num_trials):
+def simulate_permutation_statistic(
+    table,
+    group_label,
+    value_label,
+    num_trials,
+    seed=None,
+    workers=1,
+    summary=None,
+    stopping_rule=None,
+):
     """
     Simulates `num_trials` sampling steps and returns an array of the
     `abs_difference_of_means` statistic for those samples.
@@ -172,16 +638,285 @@ def simulate_permutation_statistic(table, group_label, value_label, num_trials):
                    difference in the proportion of 1's in the two groups.
 
     * num_trials:  the number of permutations to compute.
+
+    * seed:        (optional) an int, np.random.SeedSequence, or
+                   np.random.Generator used to seed the random
+                   permutations so that the results are reproducible.
+
+    * workers:     (optional) the number of processes to compute the
+                   permutations in.  The same seed gives the same results
+                   for any number of workers.
+
+    * summary:     (optional) a StreamingStatistics to add the statistics
+                   to as they are computed.  The summary is returned
+                   instead of an array.
+
+    * stopping_rule: (optional) a PValueStoppingRule that may stop the
+                     simulation before all num_trials permutations have
+                     been computed.
     """
 
-    sample_statistics = make_array()
-    for i in np.arange(num_trials):
-        one_sample = permutation_sample(table, group_label)
-        sample_statistic = abs_difference_of_means(
-            one_sample, "Shuffled Label", value_label
+    # Rather than building a shuffled table and grouping it on every trial,
+    #   we compute the same abs_difference_of_means statistic directly from
+    #   the columns, many permutations at a time.
+    _check_column_exists(table, value_label)
+    groups, codes = np.unique(table.column(group_label), return_inverse=True)
+    if len(groups) < 2:
+        raise ValueError(
+            'The column "{}" must contain at least two groups to compare, '
+            "but it only contains: {}".format(
+                group_label, ", ".join(str(g) for g in groups)
+            )
         )
-        sample_statistics = np.append(sample_statistics, sample_statistic)
-    return sample_statistics
+    values = table.column(value_label).astype(float)
+
+    # Shuffling the labels never changes the size of each group.
+    group_sizes = np.bincount(codes, minlength=len(groups))
+
+    def run_block(k, rng):
+        sample_statistics = [make_array()]
+        for permutations in _permutation_indices(table.num_rows, k, rng):
+            means = _group_means(codes[permutations], values, group_sizes)
+            sample_statistics.append(np.abs(means[:, 0] - means[:, 1]))
+        return np.concatenate(sample_statistics)
+
+    return _run_trials(
+        run_block,
+        num_trials,
+        seed,
+        workers,
+        summary=summary,
+        stopping_rule=stopping_rule,
+    )
+
+
+def _permutation_indices(num_rows, num_trials, rng):
+    """
+    Generate the row orders for num_trials permutations of a table with
+    num_rows rows, drawn from the Generator rng.  Each value produced is a
+    2-D array with one permutation per row, and we produce as many as needed
+    to keep each array under _MAX_BATCH_ELEMENTS entries.
+    """
+    batch_size = max(1, _MAX_BATCH_ELEMENTS // max(1, num_rows))
+    for start in range(0, num_trials, batch_size):
+        rows = min(batch_size, num_trials - start)
+        yield rng.permuted(np.tile(np.arange(num_rows), (rows, 1)), axis=1)
+
+
+def _group_means(shuffled_codes, values, group_sizes):
+    """
+    Each row of shuffled_codes assigns a group code to every value.  Return
+    a 2-D array whose rows hold the mean value of each group for the
+    corresponding row of codes.
+    """
+    num_rows, num_values = shuffled_codes.shape
+    num_groups = len(group_sizes)
+
+    # Give every (row, group) pair its own bin so one bincount sums them all.
+    bins = shuffled_codes + num_groups * np.arange(num_rows).reshape(-1, 1)
+    sums = np.bincount(
+        bins.ravel(),
+        weights=np.broadcast_to(values, (num_rows, num_values)).ravel(),
+        minlength=num_rows * num_groups,
+    )
+    return sums.reshape(num_rows, num_groups) / group_sizes
+
+
+class StreamingStatistics:
+    """
+    A summary of a stream of statistics that uses the same small amount
+    of memory no matter how many statistics it sees.  Pass one as the
+    `summary` argument to simulate, simulate_sample_statistic,
+    bootstrap_statistic, or simulate_permutation_statistic to summarize
+    millions of trials without keeping them all.  Example:
+
+    summary = bootstrap_statistic(sample, np.mean, 10**7, summary=StreamingStatistics())
+    summary.mean, summary.std
+    confidence_interval(95, summary)
+
+    It keeps exact running moments and (if bins are given) an exact
+    histogram.  Percentiles, confidence intervals, and p-values come from
+    a t-digest sketch of the distribution, so they are approximate,
+    although they are very accurate in the tails.
+    """
+
+    def __init__(self, bins=None, compression=1000):
+        """
+        * bins: (optional) an array of bin edges for a histogram of
+                the statistics.
+
+        * compression: the accuracy of the sketch.  The sketch holds
+                       at most about compression / 2 values.
+        """
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0  # sum of squared deviations from the mean
+        self._bins = None if bins is None else np.asarray(bins, dtype=float)
+        self._counts = None if bins is None else np.zeros(len(self._bins) - 1)
+        self._sketch = _QuantileSketch(compression)
+
+    def add(self, statistics):
+        """
+        Add a single statistic or an array of them to the summary.
+        """
+        statistics = np.ravel(np.asarray(statistics, dtype=float))
+        n = len(statistics)
+        if n == 0:
+            return
+
+        # Welford's update, generalized to add a whole batch at once.
+        batch_mean = np.mean(statistics)
+        batch_m2 = np.sum((statistics - batch_mean) ** 2)
+        total = self._count + n
+        delta = batch_mean - self._mean
+        self._mean += delta * n / total
+        self._m2 += batch_m2 + delta**2 * self._count * n / total
+        self._count = total
+
+        if self._bins is not None:
+            self._counts += np.histogram(statistics, self._bins)[0]
+        self._sketch.add(statistics)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def mean(self):
+        """The mean of the statistics."""
+        return self._mean if self._count > 0 else np.nan
+
+    @property
+    def var(self):
+        """The variance of the statistics, as np.var would compute it."""
+        return self._m2 / self._count if self._count > 0 else np.nan
+
+    @property
+    def std(self):
+        """The standard deviation of the statistics, as np.std would compute it."""
+        return np.sqrt(self.var)
+
+    @property
+    def min(self):
+        return self._sketch.min
+
+    @property
+    def max(self):
+        return self._sketch.max
+
+    def histogram(self):
+        """
+        Return the counts and bin edges of the histogram, as np.histogram would.
+        """
+        if self._bins is None:
+            raise ValueError("Pass bins to StreamingStatistics to keep a histogram.")
+        return self._counts, self._bins
+
+    def hist(self, **kwargs):
+        """
+        Draw the histogram of the statistics, as Table.hist would.
+        """
+        counts, bins = self.histogram()
+        table = Table().with_columns("bin", bins, "count", np.append(counts, 0))
+        return table.hist(bin_column="bin", **kwargs)
+
+    def percentile(self, p):
+        """
+        Return an estimate of the pth percentile of the statistics.
+        """
+        return self._sketch.quantile(p / 100)
+
+    def confidence_interval(self, ci_percent):
+        """
+        Return an array with estimates of the lower and upper bound of the
+        ci_percent confidence interval.
+        """
+        percent_in_each_tail = (100 - ci_percent) / 2
+        left = self.percentile(percent_in_each_tail)
+        right = self.percentile(100 - percent_in_each_tail)
+        return make_array(left, right)
+
+    def pvalue(self, observed_statistic, alternative="greater"):
+        """
+        Return an estimate of the proportion of the statistics that are
+        at least as extreme as observed_statistic.  See NullDistribution.pvalue
+        for the alternatives.
+        """
+        observed_statistic = np.asarray(observed_statistic, dtype=float)
+        if alternative == "greater":
+            count = self._sketch.count_at_least(observed_statistic)
+        elif alternative == "less":
+            count = self._sketch.count_at_most(observed_statistic)
+        elif alternative == "two-sided":
+            greater = self.pvalue(observed_statistic, "greater")
+            less = self.pvalue(observed_statistic, "less")
+            return np.minimum(1, 2 * np.minimum(greater, less))
+        else:
+            raise ValueError(
+                'The alternative must be "greater", "less", or "two-sided", '
+                "not {}".format(repr(alternative))
+            )
+        return count / self._count
+
+
+class _QuantileSketch:
+    """
+    A merging t-digest: the values seen so far, summarized as a sorted list
+    of centroids (a mean and a weight).  Centroids near the middle of the
+    distribution absorb many values, while those in the tails hold only a
+    few, so the tails stay accurate.
+    """
+
+    def __init__(self, compression):
+        self._compression = compression
+        self._means = make_array()
+        self._weights = make_array()
+        self.min = np.nan
+        self.max = np.nan
+
+    def add(self, values):
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.min = np.fmin(self.min, np.min(values))
+        self.max = np.fmax(self.max, np.max(values))
+
+        means = np.concatenate([self._means, values])
+        weights = np.concatenate([self._weights, np.ones(len(values))])
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+
+        # Give each point its position on the k1 scale, which is stretched
+        #   near the tails, and merge points in the same unit of that scale.
+        total = np.sum(weights)
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self._compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        _, starts = np.unique(np.floor(k), return_index=True)
+
+        self._weights = np.add.reduceat(weights, starts)
+        self._means = np.add.reduceat(means * weights, starts) / self._weights
+
+    def quantile(self, q):
+        """Estimate the qth quantile, for q between 0 and 1."""
+        if len(self._weights) == 0:
+            return np.nan
+        centers = np.cumsum(self._weights) - self._weights / 2
+        return np.interp(
+            q * np.sum(self._weights),
+            np.concatenate([[0], centers, [np.sum(self._weights)]]),
+            np.concatenate([[self.min], self._means, [self.max]]),
+        )
+
+    def count_at_least(self, x):
+        """Estimate how many values are >= x."""
+        cumulative = np.concatenate([[0], np.cumsum(self._weights)])
+        return np.sum(self._weights) - cumulative[
+            np.searchsorted(self._means, x, side="left")
+        ]
+
+    def count_at_most(self, x):
+        """Estimate how many values are <= x."""
+        cumulative = np.concatenate([[0], np.cumsum(self._weights)])
+        return cumulative[np.searchsorted(self._means, x, side="right")]
 
 
 ######################################################################
@@ -193,7 +928,12 @@ def simulate_permutation_statistic(table, group_label, value_label, num_trials):
 def confidence_interval(ci_percent, statistics):
     """
     Return an array with the lower and upper bound of the ci_percent confidence interval.
+
+    The statistics may also be a NullDistribution or StreamingStatistics.
     """
+    if isinstance(statistics, (NullDistribution, StreamingStatistics)):
+        return statistics.confidence_interval(ci_percent)
+
     # percent in each of the the left/right tails
     percent_in_each_tail = (100 - ci_percent) / 2
     left = percentile(percent_in_each_tail, statistics)
@@ -202,7 +942,9 @@ def confidence_interval(ci_percent, statistics):
 
 
 @doc_tag(path="inference-library-ref.html")
-def bootstrap_statistic(observed_sample, compute_statistic, num_trials):
+def bootstrap_statistic(
+    observed_sample, compute_statistic, num_trials, seed=None, workers=1, summary=None
+):
     """
     Creates num_trials resamples of the initial sample.
     Returns an array of the provided statistic for those samples.
@@ -215,6 +957,17 @@ def bootstrap_statistic(observed_sample, compute_statistic, num_trials):
 
     * num_trials: the number of bootstrap samples to create.
 
+    * seed: (optional) an int, np.random.SeedSequence, or
+            np.random.Generator used to seed the random resamples so
+            that the results are reproducible.
+
+    * workers: (optional) the number of processes to create the resamples
+               in.  The same seed gives the same results for any number
+               of workers.
+
+    * summary: (optional) a StreamingStatistics to add the statistics to
+               as they are computed.  The summary is returned instead of
+               an array.
     """
 
     # Check that observed_sample is an array!
@@ -224,16 +977,104 @@ def bootstrap_statistic(observed_sample, compute_statistic, num_trials):
             + str(type(observed_sample).__name__)
         )
 
-    statistics = make_array()
+    vectorized_statistic = _vectorized_statistic(compute_statistic)
 
-    for i in np.arange(0, num_trials):
-        # Key: in bootstrapping we must always sample with replacement
-        simulated_resample = np.random.choice(observed_sample, len(observed_sample))
+    def run_block(k, rng):
+        # Key: in bootstrapping we must always sample with replacement.  Each
+        #   row of indices picks out one resample.
+        batches = _resample_indices(len(observed_sample), k, rng)
 
-        resample_statistic = compute_statistic(simulated_resample)
-        statistics = np.append(statistics, resample_statistic)
+        if vectorized_statistic is not None:
+            statistics = [make_array()]
+            for indices in batches:
+                statistics.append(vectorized_statistic(observed_sample[indices]))
+            return np.concatenate(statistics)
+        else:
+            rows = (row for indices in batches for row in indices)
 
-    return statistics
+            def one_statistic():
+                simulated_resample = observed_sample[next(rows)]
+                return compute_statistic(simulated_resample)
+
+            return _collect_outcomes(one_statistic, k)
+
+    return _run_trials(run_block, num_trials, seed, workers, summary=summary)
+
+
+def _resample_indices(sample_size, num_trials, rng):
+    """
+    Generate the indices for num_trials resamples (with replacement) of a
+    sample of the given size, drawn from the Generator rng.  Each value
+    produced is a 2-D array with one row of indices per resample, and we
+    produce as many as needed to keep each array under _MAX_BATCH_ELEMENTS
+    entries.
+    """
+    batch_size = max(1, _MAX_BATCH_ELEMENTS // max(1, sample_size))
+    for start in range(0, num_trials, batch_size):
+        rows = min(batch_size, num_trials - start)
+        yield rng.integers(0, sample_size, size=(rows, sample_size))
+
+
+def _row_percentiles(p, samples):
+    """
+    The datascience percentile function applied to each row of samples.
+    """
+    if p == 0:
+        return np.min(samples, axis=1)
+    i = math.ceil((p / 100) * samples.shape[1]) - 1
+    return np.partition(samples, i, axis=1)[:, i]
+
+
+def _percentile_of(f):
+    """
+    If f is percentile curried with p, as in percentile(p), or
+    functools.partial(percentile, p), return p.  Otherwise return None.
+    """
+    original = inspect.unwrap(percentile)
+    if (
+        isinstance(f, functools.partial)
+        and inspect.unwrap(f.func) is original
+        and len(f.args) == 1
+        and not f.keywords
+    ):
+        p = f.args[0]
+    elif (
+        getattr(f, "__code__", None) in original.__code__.co_consts
+        and "p" in f.__code__.co_freevars
+    ):
+        # percentile(p) returns a lambda defined inside percentile.
+        p = f.__closure__[f.__code__.co_freevars.index("p")].cell_contents
+    else:
+        return None
+    return p if np.shape(p) == () else None
+
+
+def _vectorized_statistic(compute_statistic):
+    """
+    If compute_statistic is one of the numpy reductions we recognize, or
+    percentile(p), return a function that computes it for every row of a
+    2-D array in one call.  Otherwise return None.
+    """
+    f = inspect.unwrap(compute_statistic)
+
+    p = _percentile_of(f)
+    if p is not None:
+        return lambda samples: _row_percentiles(p, samples)
+
+    for reduction in [
+        np.mean,
+        np.median,
+        np.std,
+        np.var,
+        np.sum,
+        np.min,
+        np.max,
+        np.count_nonzero,
+    ]:
+        if f is inspect.unwrap(reduction):
+            return lambda samples: reduction(samples, axis=1)
+
+    return None
 
 
 ######################################################################
@@ -241,6 +1082,103 @@ def bootstrap_statistic(observed_sample, compute_statistic, num_trials):
 ######################################################################
 
 
+class _ColumnStatistics:
+    """
+    The x and y columns of a table as float arrays, along with the summary
+    statistics the regression functions need.  With these, most of those
+    functions take constant time.
+    """
+
+    def __init__(self, x, y):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.n = len(self.x)
+        self.x_mean = np.mean(self.x)
+        self.y_mean = np.mean(self.y)
+
+        # Sums of squares and products of the deviations from the means.
+        x_deviations = self.x - self.x_mean
+        y_deviations = self.y - self.y_mean
+        self.ss_x = np.dot(x_deviations, x_deviations)
+        self.ss_y = np.dot(y_deviations, y_deviations)
+        self.ss_xy = np.dot(x_deviations, y_deviations)
+
+    def mean_squared_error(self, a, b):
+        """
+        The mean squared error of the line y = a * x + b.  The slope a and
+        intercept b may also be arrays, in which case they are broadcast.
+
+        Writing each residual as (y - y_mean) - a * (x - x_mean) + c, where
+        c = y_mean - a * x_mean - b, the cross terms sum to zero, leaving
+        (ss_y - 2 * a * ss_xy + a**2 * ss_x) / n + c**2.
+        """
+        c = self.y_mean - a * self.x_mean - b
+        mse = (self.ss_y - 2 * a * self.ss_xy + a**2 * self.ss_x) / self.n + c**2
+        # Rounding can make a perfect fit come out slightly negative.
+        return np.maximum(mse, 0)
+
+
+# Statistics for the most recently used (table, x_label, y_label) triples,
+# most recent last.
+_COLUMN_CACHE_SIZE = 32
+_column_cache = OrderedDict()
+
+
+def _forget_table(table_ref):
+    """
+    Drop the statistics for a table that no longer exists.  The statistics
+    may share their arrays with the table's columns, so keeping them would
+    keep those columns alive.
+    """
+    for key, (refs, statistics) in list(_column_cache.items()):
+        if refs[0] is table_ref:
+            del _column_cache[key]
+
+
+def _column_statistics(table, x_label, y_label):
+    """
+    Return the _ColumnStatistics for the given columns of table, reusing
+    the cached statistics if the table still has the same column arrays.
+    """
+    x_column = table.column(x_label)
+    y_column = table.column(y_label)
+
+    # Weak references let us check that the table and its columns are the
+    #   ones we saw before without keeping them alive.
+    key = (id(table), x_label, y_label)
+    if key in _column_cache:
+        refs, statistics = _column_cache[key]
+        if all(ref() is v for ref, v in zip(refs, [table, x_column, y_column])):
+            _column_cache.move_to_end(key)
+            return statistics
+
+    statistics = _ColumnStatistics(x_column, y_column)
+    refs = [
+        weakref.ref(table, _forget_table),
+        weakref.ref(x_column),
+        weakref.ref(y_column),
+    ]
+    _column_cache[key] = (refs, statistics)
+    _column_cache.move_to_end(key)
+    while len(_column_cache) > _COLUMN_CACHE_SIZE:
+        _column_cache.popitem(last=False)
+    return statistics
+
+
+@doc_tag(path="inference-library-ref.html")
+def clear_column_cache(table=None):
+    """
+    The regression functions remember summary statistics for the columns
+    of tables they have seen.  Changing the values in a column in place
+    (rather than making a new table or column) is not detected, so call
+    this function afterwards to forget the statistics for that table, or
+    for all tables if no table is given.
+    """
+    for key in list(_column_cache):
+        if table is None or key[0] == id(table):
+            del _column_cache[key]
+
+
 @doc_tag(path="inference-library-ref.html")
 def pearson_correlation(table, x_label, y_label):
     """
@@ -248,12 +1186,9 @@ def pearson_correlation(table, x_label, y_label):
     and strength of the association between the given columns in the
     table.
     """
-    x = table.column(x_label)
-    y = table.column(y_label)
-    x_mean = np.mean(x)
-    y_mean = np.mean(y)
-    numerator = sum((x - x_mean) * (y - y_mean))
-    denominator = np.sqrt(sum((x - x_mean) ** 2)) * np.sqrt(sum((y - y_mean) ** 2))
+    statistics = _column_statistics(table, x_label, y_label)
+    numerator = statistics.ss_xy
+    denominator = np.sqrt(statistics.ss_x) * np.sqrt(statistics.ss_y)
     return numerator / denominator
 
 
@@ -273,13 +1208,11 @@ def mean_squared_error(table, x_label, y_label, a, b):
     intercept b when used to fit the data in the tables x_label and y_label
     columns.
     """
-    y_hat = line_predictions(a, b, table.column(x_label))
-    residual = table.column(y_label) - y_hat
-    return np.mean(residual**2)
+    return _column_statistics(table, x_label, y_label).mean_squared_error(a, b)
 
 
 @doc_tag(path="inference-library-ref.html")
-def linear_regression(table, x_label, y_label):
+def linear_regression(table, x_label, y_label, method="exact"):
     """
     Return an array containing the slope and intercept of the line best fitting
     the table's data according to the mean square error loss function.  Example:
@@ -291,8 +1224,23 @@ def linear_regression(table, x_label, y_label):
     OR
 
     a,b = linear_regression(fortis, 'Beak length, mm', 'Beak depth, mm')
+
+    By default, the line is computed exactly with the least squares formulas.
+    Pass method="minimize" to instead search for the line with `minimize`,
+    as we do in lecture.
     """
 
+    if method == "exact":
+        statistics = _column_statistics(table, x_label, y_label)
+        a = statistics.ss_xy / statistics.ss_x
+        b = statistics.y_mean - a * statistics.x_mean
+        return make_array(a, b)
+    elif method != "minimize":
+        raise ValueError(
+            'The method for linear_regression must be "exact" or "minimize", '
+            "not {}".format(repr(method))
+        )
+
     # A helper function that takes *only* the two variables we need to optimize.
     # This is necessary to use minimize below, because the function we want
     # to minimize cannot take any parameters beyond those it will solve for.
@@ -304,6 +1252,67 @@ def linear_regression(table, x_label, y_label):
     return minimize(mse_for_a_b)
 
 
+@doc_tag(path="inference-library-ref.html")
+def fit_lines(x, y):
+    """
+    Return an array containing the slope and intercept of the least squares
+    line for the data in arrays x and y.
+
+    x and y may also be 2-D arrays with one data set per row, in which case
+    all of the lines are fit at once and the result holds an array of slopes
+    and an array of intercepts:
+
+    slopes, intercepts = fit_lines(xs, ys)
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # The normal equations for y = a * x + b, written in terms of
+    #   deviations from the means to avoid losing precision.
+    x_mean = np.mean(x, axis=-1, keepdims=True)
+    y_mean = np.mean(y, axis=-1, keepdims=True)
+    x_deviations = x - x_mean
+    y_deviations = y - y_mean
+    a = np.sum(x_deviations * y_deviations, axis=-1) / np.sum(
+        x_deviations**2, axis=-1
+    )
+    b = y_mean[..., 0] - a * x_mean[..., 0]
+    return np.array([a, b])
+
+
+@doc_tag(path="inference-library-ref.html")
+def bootstrap_regression(table, x_label, y_label, num_trials, seed=None, workers=1):
+    """
+    Creates num_trials resamples of the table's rows and fits a least squares
+    line to each.  Returns an array containing an array of the slopes and an
+    array of the intercepts for those lines.  Example:
+
+    slopes, intercepts = bootstrap_regression(fortis, 'Beak length, mm', 'Beak depth, mm', 1000)
+    confidence_interval(95, slopes)
+
+    * seed: (optional) an int, np.random.SeedSequence, or
+            np.random.Generator used to seed the random resamples so
+            that the results are reproducible.
+
+    * workers: (optional) the number of processes to create the resamples
+               in.  The same seed gives the same results for any number
+               of workers.
+    """
+    x = table.column(x_label).astype(float)
+    y = table.column(y_label).astype(float)
+
+    def run_block(k, rng):
+        # Resample (x, y) pairs: the same row indices pick out both columns.
+        lines = [make_array()]
+        for indices in _resample_indices(len(x), k, rng):
+            a, b = fit_lines(x[indices], y[indices])
+            lines.append(np.column_stack([a, b]).ravel())
+        return np.concatenate(lines)
+
+    lines = _run_trials(run_block, num_trials, seed, workers)
+    return lines.reshape(-1, 2).T
+
+
 @doc_tag(path="inference-library-ref.html")
 def residuals(table, x_label, y_label, a, b):
     """
@@ -311,10 +1320,9 @@ def residuals(table, x_label, y_label, a, b):
     where y_hat are the predictions from the line characterized by
     y = ax+b
     """
-    x = table.column(x_label)
-    y = table.column(y_label)
-    y_hat = line_predictions(a, b, x)
-    residual = y - y_hat
+    statistics = _column_statistics(table, x_label, y_label)
+    y_hat = line_predictions(a, b, statistics.x)
+    residual = statistics.y - y_hat
     return residual
 
 
@@ -324,11 +1332,9 @@ def r2_score(table, x_label, y_label, a, b):
     R-squared score (also called the "coefficient of determination")
     for the predictions given y=ax+b
     """
-    residual = residuals(table, x_label, y_label, a, b)
-    numerator = sum(residual**2)
-    y = table.column(y_label)
-    y_mean = np.mean(y)
-    denominator = sum((y - y_mean) ** 2)
+    statistics = _column_statistics(table, x_label, y_label)
+    numerator = statistics.n * statistics.mean_squared_error(a, b)
+    denominator = statistics.ss_y
     return 1 - numerator / denominator
 
 
@@ -347,8 +1353,8 @@ def plot_scatter_with_line(table, x_label, y_label, a, b):
         x_label, y_label, title="a = " + str(round(a, 3)) + "; b = " + str(round(b, 3))
     )
 
-    x = table.column(x_label)
-    xlims = make_array(min(x), max(x))
+    x = _column_statistics(table, x_label, y_label).x
+    xlims = make_array(np.min(x), np.max(x))
     plot.line(xlims, a * xlims + b, lw=2, color="C0")
 
     return plot
@@ -364,7 +1370,7 @@ def plot_residuals(table, x_label, y_label, a, b):
     """
     x = table.column(x_label)
     residual = residuals(table, x_label, y_label, a, b)
-    largest_residual = abs(max(residual))
+    largest_residual = abs(np.max(residual))
     residual_table = Table().with_columns(x_label, x, "residuals", residual)
     plot = residual_table.scatter(
         x_label,
@@ -402,24 +1408,54 @@ def plot_regression_and_residuals(table, x_label, y_label, a, b, figure=None):
 ######################################################################
 
 
+def _mean_squared_error_grid(statistics, a_space, b_space):
+    """
+    Return a 2-D array of the mean squared errors of the lines y = a * x + b
+    for every a in a_space (columns) and b in b_space (rows), computed from
+    the _ColumnStatistics for the data.  This takes time proportional to the
+    size of the grid, no matter how many rows the data has.  The grid is
+    filled a band of rows at a time to keep the temporary arrays small.
+    """
+    a_space = np.asarray(a_space, dtype=float).reshape(1, -1)
+    b_space = np.asarray(b_space, dtype=float).reshape(-1, 1)
+
+    mses = np.empty((b_space.shape[0], a_space.shape[1]))
+    rows_per_band = max(1, _MAX_BATCH_ELEMENTS // max(1, a_space.shape[1]))
+    for start in range(0, b_space.shape[0], rows_per_band):
+        band = slice(start, start + rows_per_band)
+        mses[band] = statistics.mean_squared_error(a_space, b_space[band])
+    return mses
+
+
 def plot_regression_line_and_mse_heat(
-    table, x_label, y_label, a, b, show_mse=None, a_space=None, b_space=None, _fig=None
+    table,
+    x_label,
+    y_label,
+    a,
+    b,
+    show_mse=None,
+    a_space=None,
+    b_space=None,
+    _fig=None,
+    resolution=200,
 ):
     """
     Left plot: the scatter plot with line y=ax+b
     Right plot: None, 2D heat map of MSE, or 3D surface plot of MSE
     Returns the Plot object for the scatter plot
+
+    The MSE is shown for a grid of resolution x resolution lines, unless
+    a_space and b_space are given.
     """
     if a_space is None:
-        a_space = np.linspace(-10 * a, 10 * a, 200)
+        a_space = np.linspace(-10 * a, 10 * a, resolution)
     if b_space is None:
-        b_space = np.linspace(-10 * b, 10 * b, 200)
+        b_space = np.linspace(-10 * b, 10 * b, resolution)
+    if show_mse in ("2d", "3d"):
+        mses = _mean_squared_error_grid(
+            _column_statistics(table, x_label, y_label), a_space, b_space
+        )
     a_space, b_space = np.meshgrid(a_space, b_space)
-    broadcasted = np.broadcast(a_space, b_space)
-    mses = np.empty(broadcasted.shape)
-    mses.flat = [
-        mean_squared_error(table, x_label, y_label, a, b) for (a, b) in broadcasted
-    ]
 
     if _fig is None:
         _fig = Figure(1, 2)
@@ -15,11 +15,21 @@ __all__ = [
     "Slider",
     "Choice",
     "html_interact",
+    "remove_unused_images",
 ]
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from numbers import Integral
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from numbers import Integral, Number
+import base64
+import copy
+import gzip
+import hashlib
+import io
+import multiprocessing
 import os
+import time
 import json
 import textwrap
 from IPython.display import display, HTML
@@ -28,10 +38,32 @@ import numpy as np
 import uuid
 import itertools
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PathCollection
+from matplotlib.colors import to_hex, to_rgba
+from matplotlib.lines import Line2D
+from matplotlib.patches import Rectangle
 from datascience import Table, Plot, Figure
 from abc import ABC, abstractmethod
 
 
+from ._random import _seed_sequence
+from ._render import (
+    _IMAGE_FORMATS,
+    _IMAGE_NAME,
+    _Uncacheable,
+    _cache_evict,
+    _cache_get,
+    _cache_put,
+    _check_image_format,
+    _encode_image,
+    _environment,
+    _fingerprint,
+    _record_images,
+    _save_image,
+    _updating_manifest,
+    _worker_count,
+)
 from .docs import doc_tag
 import inspect
 
@@ -111,6 +143,13 @@ class Control(ABC):
     def _format(self, v):
         pass
 
+    @abstractmethod
+    def _initial(self):
+        pass
+
+    def _cache_description(self):
+        return self._v
+
 
 class Fixed(Control):
     """
@@ -140,6 +179,9 @@ class Fixed(Control):
     def _format(self, v):
         return None
 
+    def _initial(self):
+        return self._value
+
 
 class CheckBox(Control):
     """
@@ -186,6 +228,9 @@ class CheckBox(Control):
     def _format(self, v):
         return "true" if v else "false"
 
+    def _initial(self):
+        return self._v
+
 
 class Slider(Control):
     """
@@ -219,7 +264,7 @@ class Slider(Control):
 
     def _html(self, name):
         uid = self._uid
-        params = f'min="{self._v[0]}" max="{self._v[1]}" step="{self._v[2]}"'
+        params = f'min="{self._v[0]}" max="{self._v[1]}" step="{self._v[2]}" value="{self._initial()}"'
 
         return f"""\
             <div class="interact-inline">
@@ -261,6 +306,13 @@ class Slider(Control):
             str_value = "0.000000"
         return str_value
 
+    def _initial(self):
+        # The value closest to the middle, where browsers start a range input.
+        #   Like browsers, take the larger one on a tie.
+        values = self._values()
+        distances = np.abs(values - (self._v[0] + self._v[1]) / 2)
+        return values[np.isclose(distances, distances.min())].max()
+
 
 class Choice(Control):
     """
@@ -317,6 +369,9 @@ class Choice(Control):
     def _format(self, v):
         return str(v)
 
+    def _initial(self):
+        return self._v[0]
+
 
 def create_csv_line(values):
     def escape_and_quote(value):
@@ -335,46 +390,480 @@ def create_csv_line(values):
     return ",".join(escape_and_quote(value) for value in values)
 
 
-def _permutations(f, kwargs):
-    # def image_height(v):
-    #     if (v == None and plt.get_fignums()) or type(v) == Plot or type(v) == Figure:
-    #         fig = plt.gcf()
-    #         fig.set_tight_layout(True)
-    #         size = fig.get_size_inches() * fig.dpi  # size in pixels
-    #         return size[1]
-    #     else:
-    #         return None
-    
-    def htmlify(v):
-        if (v == None and plt.get_fignums()) or type(v) == Plot or type(v) == Figure:
-            fig = plt.gcf()
-            fig.set_tight_layout(True)
-            fid = uuid()
+def _numbers(values):
+    """
+    A list of the values, with 6 significant digits, for embedding as JSON.
+    Infinities and NaNs, which JSON lacks, become None.
+    """
+    return [
+        float(f"{x:.6g}") if np.isfinite(x) else None
+        for x in np.asarray(values, dtype=float).ravel()
+    ]
+
+
+def _color(c):
+    """
+    The hex color and alpha for the matplotlib color c.  Invisible colors
+    are "none".
+    """
+    rgba = to_rgba(c)
+    return to_hex(rgba) if rgba[3] > 0 else "none", _numbers([rgba[3]])[0]
 
-            os.makedirs("images", exist_ok=True)
-            prefix = os.getenv("LECTURE_NAME", "ex")
-            filename = f"images/{prefix}-image-{fid}.png"
 
-            with open(filename, "wb") as f:
-                plt.savefig(f, format="png")
-            size = fig.get_size_inches() * fig.dpi  # size in pixels
+def _vector_ticks(axis, lo, hi):
+    ticks = axis.get_majorticklocs()
+    labels = axis.get_major_formatter().format_ticks(ticks)
+    shown = [
+        (t, label)
+        for t, label in zip(ticks, labels)
+        if min(lo, hi) <= t <= max(lo, hi)
+    ]
+    return {
+        "at": _numbers([t for t, _ in shown]),
+        "labels": [label for _, label in shown],
+    }
+
+
+def _vector_axes(ax):
+    """
+    The lines, scatter plots, bars, and labels drawn on the axes, as a dict
+    of numbers and strings.  Raises a ValueError for anything else.
+    """
+    if ax.get_xscale() != "linear" or ax.get_yscale() != "linear":
+        raise ValueError("vector=True only draws axes with linear scales")
+
+    lines = []
+    for line in ax.get_lines():
+        if not line.get_visible():
+            continue
+        xy = line.get_xydata()
+        color, alpha = _color(line.get_color())
+        marker = line.get_marker()
+        lines.append(
+            {
+                "x": _numbers(xy[:, 0]),
+                "y": _numbers(xy[:, 1]),
+                "color": color,
+                "alpha": alpha,
+                "width": line.get_linewidth(),
+                "style": line.get_linestyle(),
+                "marker": marker if marker not in (None, "", "None", " ") else None,
+                "size": line.get_markersize(),
+                "fill": _color(line.get_markerfacecolor())[0],
+            }
+        )
+
+    points = []
+    for collection in ax.collections:
+        if (
+            not isinstance(collection, PathCollection)
+            or collection.get_offset_transform() != ax.transData
+        ):
+            raise ValueError(
+                f"vector=True only draws lines, scatter plots, and bars, not {collection}"
+            )
+        offsets = np.asarray(collection.get_offsets())
+        colors = [_color(c) for c in collection.get_facecolors()]
+        points.append(
+            {
+                "x": _numbers(offsets[:, 0]),
+                "y": _numbers(offsets[:, 1]),
+                "sizes": _numbers(collection.get_sizes()),
+                "colors": [c for c, _ in colors],
+                "alphas": [a for _, a in colors],
+            }
+        )
 
-            plt.close("all")
-            return filename, size[1]
+    bars = []
+    for patch in ax.patches:
+        if not isinstance(patch, Rectangle):
+            raise ValueError(
+                f"vector=True only draws lines, scatter plots, and bars, not {patch}"
+            )
+        x, y, w, h = _numbers(
+            [patch.get_x(), patch.get_y(), patch.get_width(), patch.get_height()]
+        )
+        color, alpha = _color(patch.get_facecolor())
+        bars.append(
+            {
+                "x": x,
+                "y": y,
+                "w": w,
+                "h": h,
+                "color": color,
+                "alpha": alpha,
+                "edge": _color(patch.get_edgecolor())[0],
+                "width": patch.get_linewidth(),
+            }
+        )
+
+    if ax.images or ax.texts or ax.artists or ax.tables:
+        raise ValueError("vector=True only draws lines, scatter plots, and bars")
 
-        if hasattr(v, "_repr_html_"):
-            return v._repr_html_(), None  # yep, fancy format!
+    legend = []
+    if ax.get_legend() is not None:
+        for text, handle in zip(
+            ax.get_legend().get_texts(), ax.get_legend().legend_handles
+        ):
+            if isinstance(handle, Line2D):
+                color = handle.get_color()
+            else:
+                color = handle.get_facecolor()
+            color = color[0] if np.ndim(color) == 2 else color
+            legend.append({"label": text.get_text(), "color": _color(color)[0]})
+
+    xlim, ylim = ax.get_xlim(), ax.get_ylim()
+    return {
+        "bounds": _numbers(ax.get_position().bounds),
+        "xlim": _numbers(xlim),
+        "ylim": _numbers(ylim),
+        "xticks": _vector_ticks(ax.xaxis, *xlim),
+        "yticks": _vector_ticks(ax.yaxis, *ylim),
+        "title": ax.get_title(),
+        "xlabel": ax.get_xlabel(),
+        "ylabel": ax.get_ylabel(),
+        "fontsize": ax.xaxis.label.get_fontsize(),
+        "lines": lines,
+        "points": points,
+        "bars": bars,
+        "legend": legend,
+    }
+
+
+def _vector_figure(fig):
+    """
+    The contents of fig as JSON, for the browser to draw.
+    """
+    width, height = fig.get_size_inches() * fig.dpi
+    figure = {
+        "width": round(width),
+        "height": round(height),
+        "dpi": fig.dpi,
+        "axes": [_vector_axes(ax) for ax in fig.axes if ax.get_visible()],
+    }
+    return json.dumps(figure, separators=(",", ":"))
+
+
+class _Raster:
+    """
+    Turns figures into image bytes.  The quality is the zlib compression
+    level (0-9) for PNG images, or the quality (0-100) for WebP and JPEG
+    images.  The subplot layout is computed for the first figure and
+    reused for the rest, which saves a draw per figure and keeps the axes
+    from moving around as the controls change.  The format "vector" turns
+    figures into JSON describing what is plotted instead.
+    """
+
+    def __init__(self, format="png", quality=None):
+        if format != "vector":
+            _check_image_format(format)
+        self.format = format
+        self.quality = quality
+        self.layout = None
+
+    def encode(self, fig):
+        canvas = FigureCanvasAgg(fig)
+        if self.layout is None:
+            fig.set_tight_layout(True)
+            canvas.draw()
+            self.layout = {
+                k: float(getattr(fig.subplotpars, k))
+                for k in ("left", "right", "bottom", "top", "wspace", "hspace")
+            }
         else:
-            return f"<pre>{v}</pre>", None
+            fig.set_layout_engine("none")
+            fig.subplots_adjust(**self.layout)
+            if self.format != "vector":
+                canvas.draw()
+
+        if self.format == "vector":
+            return _vector_figure(fig)
+
+        return _encode_image(canvas.buffer_rgba(), self.format, self.quality)
+
+
+def _rendered(v, raster=None):
+    """
+    Render the result v of calling an interact function.  Returns either
+    (the image format, the image bytes, the image height) for plots, or
+    ("vector", the JSON, the height) for plots if the raster's format is
+    "vector", or ("html", the html text, None) for anything else.  Plots are turned
+    into images by raster, which is a PNG _Raster if None.
+    """
+    if (v == None and plt.get_fignums()) or type(v) == Plot or type(v) == Figure:
+        if raster is None:
+            raster = _Raster()
+        fig = plt.gcf()
+        image = raster.encode(fig)
+        size = fig.get_size_inches() * fig.dpi  # size in pixels
+
+        plt.close("all")
+        return raster.format, image, size[1]
+
+    if hasattr(v, "_repr_html_"):
+        return "html", v._repr_html_(), None  # yep, fancy format!
+    else:
+        return "html", f"<pre>{v}</pre>", None
+
+
+@contextmanager
+def _rendering():
+    """
+    Turn off plotting and make tables bigger while computing the function.
+    Add any other special cases about displaying output here.
+    """
+    with plt.ioff():
+        max_str_rows = Table.max_str_rows
+        try:
+            Table.max_str_rows = 30
+            yield
+        finally:
+            Table.max_str_rows = max_str_rows
+
+
+def _render(f, fixed, params, raster=None):
+    """
+    Call f on one combination of parameter values and render the result.
+    Returns the csv key for the combination followed by the values
+    produced by _rendered.
+    """
+    keys = [(x, v) for (x, (_, v)) in params]
+    values = [(x, v) for (x, (v, _)) in params]
+    result = f(**(dict(values) | dict(fixed)))
+    key = create_csv_line((list(zip(*keys))[1]))
+    return (key,) + _rendered(result, raster)
+
+
+# The function, fixed values, and raster for the current parallel precompute.
+# Worker processes are forked after this is set, so they inherit it without
+# pickling.
+_parallel_render = None
 
-    def precompute(f, fixed, params):
-        keys = [(x, v) for (x, (_, v)) in params]
-        values = [(x, v) for (x, (v, _)) in params]
-        result = f(**(dict(values) | dict(fixed)))
-        key = create_csv_line((list(zip(*keys))[1]))
-        html, iheight = htmlify(result)
-        return (key, html), iheight
 
+def _render_seeded(f, fixed, params, raster, seed_sequence):
+    """
+    Call _render with np.random seeded from seed_sequence, so combinations
+    rendered in different processes don't share random numbers.
+    """
+    state = np.random.get_state()
+    try:
+        np.random.seed(seed_sequence.generate_state(4))
+        return _render(f, fixed, params, raster)
+    finally:
+        np.random.set_state(state)
+
+
+def _render_parallel(params, seed_sequence):
+    f, fixed, raster = _parallel_render
+    return _render_seeded(f, fixed, params, raster, seed_sequence)
+
+
+def _render_all(f, fixed, combinations, workers=1, raster=None):
+    """
+    Render every combination of parameter values, in order.  The work is
+    shared among `workers` processes.  Each process has its own copy of
+    pyplot, so they never draw on each other's figures.  np.random is
+    seeded separately for each combination from streams spawned from
+    np.random's state, so the results don't depend on the number of
+    workers.
+    """
+    global _parallel_render
+
+    if raster is None:
+        raster = _Raster()
+    workers = min(_worker_count(workers), len(combinations))
+    seed_sequences = _seed_sequence().spawn(len(combinations))
+
+    # Forking lets workers run functions defined in a notebook, which we
+    #   could not pickle.  Without it, render everything here.
+    if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return [
+            _render_seeded(f, fixed, params, raster, seed_sequence)
+            for params, seed_sequence in zip(combinations, seed_sequences)
+        ]
+
+    # Render the first one here, so the workers share its layout.
+    first = _render_seeded(f, fixed, combinations[0], raster, seed_sequences[0])
+
+    previous_render = _parallel_render
+    _parallel_render = (f, fixed, raster)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            return [first] + list(
+                executor.map(
+                    _render_parallel,
+                    combinations[1:],
+                    seed_sequences[1:],
+                    chunksize=max(1, len(combinations) // (4 * workers)),
+                )
+            )
+    finally:
+        _parallel_render = previous_render
+
+
+def _save_bundle(images):
+    """
+    Write all of the images in the list to a single bundle file in the
+    images directory, so the browser can fetch them in one request.
+    Returns the (offset, length) of each image in the bundle, and the
+    bundle's file name.  Identical images are only stored once.
+    """
+    bundle = io.BytesIO()
+    offsets = {}
+    for image in images:
+        if image not in offsets:
+            offsets[image] = [bundle.tell(), len(image)]
+            bundle.write(image)
+
+    data = bundle.getvalue()
+    digest = hashlib.sha256(data).hexdigest()[:20]
+
+    os.makedirs("images", exist_ok=True)
+    prefix = os.getenv("LECTURE_NAME", "ex")
+    filename = f"images/{prefix}-bundle-{digest}.bin"
+
+    if not os.path.exists(filename):
+        with open(filename, "wb") as f:
+            f.write(data)
+    return [offsets[image] for image in images], filename
+
+
+def _inline_json(value):
+    """
+    Compact JSON for value that is safe to put inside a <script> tag.
+    """
+    return json.dumps(value, separators=(",", ":")).replace("</", "<\\/")
+
+
+def _encode_outputs(data):
+    """
+    Encode the map data from csv keys to html outputs compactly.  Each
+    distinct output is stored once, in a list of values, with the prefix
+    and suffix shared by all of them (eg: a table's header and closing
+    tags) pulled out.  The keys map to indices into the values.
+    """
+    values = list(dict.fromkeys(data.values()))
+    index = {v: i for i, v in enumerate(values)}
+
+    prefix = os.path.commonprefix(values)
+    shortest = min(len(v) for v in values) - len(prefix)
+    suffix = os.path.commonprefix([v[::-1] for v in values])[::-1]
+    suffix = suffix[len(suffix) - shortest :] if shortest < len(suffix) else suffix
+
+    return {
+        "prefix": prefix,
+        "suffix": suffix,
+        "values": [v[len(prefix) : len(v) - len(suffix)] for v in values],
+        "keys": {key: index[v] for key, v in data.items()},
+    }
+
+
+def _data_loader(data, compress=False, sidecar=False):
+    """
+    Return JavaScript for a Promise of the encoded outputs in data.  They
+    are embedded in the page unless sidecar is True, in which case they
+    are written to a file in the images directory and fetched when the
+    widget loads.  If compress is True, they are gzipped too, and the
+    browser unzips them with a DecompressionStream.
+    """
+    text = json.dumps(_encode_outputs(data), separators=(",", ":"))
+    if not sidecar and not compress:
+        # Safe inside a <script> tag, as _inline_json would make it.
+        inline = text.replace("</", "<\\/")
+        return f"Promise.resolve({inline})"
+
+    payload = text.encode()
+    if compress:
+        payload = gzip.compress(payload, mtime=0)
+
+    if not sidecar:
+        encoded = base64.b64encode(payload).decode()
+        return f'decompressInteractData(fetch("data:;base64,{encoded}"))'
+
+    digest = hashlib.sha256(payload).hexdigest()[:20]
+    prefix = os.getenv("LECTURE_NAME", "ex")
+    filename = f"images/{prefix}-data-{digest}.json" + (".gz" if compress else "")
+
+    os.makedirs("images", exist_ok=True)
+    if not os.path.exists(filename):
+        with open(filename, "wb") as f:
+            f.write(payload)
+    _record_images([filename])
+
+    if compress:
+        return f'decompressInteractData(fetch("{filename}"))'
+    else:
+        return f'fetch("{filename}").then(response => response.json())'
+
+
+def remove_unused_images(since):
+    """
+    Delete the images html_interact and animate wrote to the images
+    directory that have not been used since the time `since` (in seconds,
+    as from time.time()).
+
+    For example, record the time, re-run every notebook that uses
+    html_interact or animate, and then call this function with the recorded time to
+    remove the images none of them use anymore.  Returns the number of
+    images removed.
+    """
+    if not os.path.isdir("images"):
+        return 0
+    removed = 0
+    with _updating_manifest() as manifest:
+        for name in os.listdir("images"):
+            filename = f"images/{name}"
+            if _IMAGE_NAME.fullmatch(name) and manifest.get(filename, 0) < since:
+                os.remove(filename)
+                removed += 1
+        for filename in [name for name in manifest if not os.path.exists(name)]:
+            del manifest[filename]
+    return removed
+
+
+def _cache_keys(f, fixed, combinations, raster):
+    """
+    Return the cache key for each combination of parameter values, or None
+    if f or the fixed values can't be fingerprinted.
+    """
+    h = hashlib.sha256()
+    try:
+        _fingerprint(
+            h,
+            (
+                f,
+                fixed,
+                Table.max_str_rows,
+                raster.format,
+                raster.quality,
+                _environment(),
+            ),
+            {},
+        )
+    except (_Uncacheable, RecursionError, ValueError):
+        # ValueError: a closure refers to a variable that isn't set yet.
+        return None
+
+    keys = []
+    for params in combinations:
+        combination = h.copy()
+        combination.update(repr([(x, v) for (x, (_, v)) in params]).encode())
+        keys.append(combination.hexdigest())
+    return keys
+
+
+def _permutations(
+    f,
+    kwargs,
+    workers=1,
+    cache=False,
+    bundle=False,
+    extra=(),
+    raster=None,
+    first=None,
+):
     lists = [
         [(param, (v, control._format(v))) for v in control._values()]
         for param, control in kwargs.items()
@@ -387,30 +876,316 @@ def _permutations(f, kwargs):
         if isinstance(control, Fixed)
     ]
 
-    # Turn off plotting and make tables bigger while computing the function.
-    # Add any other special cases about displaying output here.
+    # Extra combinations, like a live widget's starting point, are computed
+    #   too unless they are already in the grid.
+    res = list(itertools.product(*lists))
+    grid = {tuple(fv for _, (_, fv) in params) for params in res}
+    res += [
+        params for params in extra if tuple(fv for _, (_, fv) in params) not in grid
+    ]
 
-    with plt.ioff():
-        res = list(itertools.product(*lists))
-        max_str_rows = Table.max_str_rows
-        iheight = None
+    if raster is None:
+        raster = _Raster()
+
+    with _rendering():
+        keys = _cache_keys(f, fixed, res, raster) if cache else None
+
+        # The first combination's plot sets the layout for the rest, so it
+        #   is always rendered or read from the cache first, unless the
+        #   caller already rendered it with raster (eg: to measure it).  Its
+        #   cache entry holds the layout, and the layout is part of the
+        #   other entries' keys, so cached plots always match it.
+        cached = _cache_get(keys[0]) if keys is not None and first is None else None
+        if cached is not None:
+            first, layout = cached[:-1], cached[-1]
+            raster.layout = dict(layout) if layout is not None else None
+        else:
+            if first is None:
+                first = _render_all(f, fixed, res[:1], 1, raster)[0]
+            if keys is not None:
+                layout = raster.layout
+                layout = tuple(layout.items()) if layout is not None else None
+                _cache_put(keys[0], first + (layout,))
+
+        if keys is None:
+            rendered = [first] + _render_all(f, fixed, res[1:], workers, raster)
+        else:
+            # Only render the combinations that aren't in the cache.
+            layout = repr(raster.layout).encode()
+            keys = [
+                hashlib.sha256(key.encode() + layout).hexdigest() for key in keys
+            ]
+            rendered = [first] + [_cache_get(key) for key in keys[1:]]
+            missing = [i for i, r in enumerate(rendered) if r is None]
+            missing_rendered = _render_all(
+                f, fixed, [res[i] for i in missing], workers, raster
+            )
+            for i, r in zip(missing, missing_rendered):
+                rendered[i] = r
+                _cache_put(keys[i], r)
+            if missing:
+                _cache_evict()
+
+    # Replace each image with its file name, or its location in the bundle.
+    images = [
+        (kind, output) for _, kind, output, _ in rendered if kind in _IMAGE_FORMATS
+    ]
+    if bundle and images:
+        locations, bundle_filename = _save_bundle([image for _, image in images])
+        _record_images([bundle_filename])
+    else:
+        locations = [_save_image(image, kind) for kind, image in images]
+        bundle_filename = None
+        if locations:
+            _record_images(locations)
+
+    locations = iter(locations)
+    precomputed = [
+        (key, next(locations) if kind in _IMAGE_FORMATS else output)
+        for key, kind, output, _ in rendered
+    ]
+
+    iheight = rendered[0][3]
+    return dict(precomputed), iheight, bundle_filename
+
+
+# Live widgets ask the kernel for combinations that were not precomputed
+#   through a pair of hidden ipywidgets, whose values ipywidgets keeps in
+#   sync with the kernel in any frontend that shows widgets.  The kernel
+#   keeps the function for each live widget and an LRU cache of what it has
+#   rendered, both bounded.
+_LIVE_MAX_WIDGETS = 64
+_LIVE_CACHE_SIZE = 256
+
+_live_widgets = OrderedDict()
+_live_renders = OrderedDict()
+
+
+def _has_kernel():
+    """
+    Whether we are running in a kernel that can show widgets, rather than
+    eg: when a notebook is being exported.
+    """
+    try:
+        from IPython import get_ipython
+    except ImportError:
+        return False
+    return getattr(get_ipython(), "kernel", None) is not None
+
+
+def _bracketing_values(full, coarse):
+    """
+    Map each formatted value of the full-resolution control to [lo, hi, t]:
+    the formatted values in its downsampled copy on either side of it, and
+    how far it is from lo to hi.  Pages can then show the nearest
+    precomputed result, or blend the two.  Non-numeric values have
+    lo == hi, the closest value in the list, and t == 0.
+    """
+    full_values = list(full._values())
+    coarse_values = list(coarse._values())
+
+    if all(
+        isinstance(v, Number) and not isinstance(v, bool)
+        for v in full_values + coarse_values
+    ):
+        where = np.array(full_values, dtype=float)
+        targets = np.array(coarse_values, dtype=float)
+    else:
+        where = np.arange(len(full_values))
+        targets = np.array([full_values.index(v) for v in coarse_values])
+
+    order = np.argsort(targets, kind="stable")
+    targets = targets[order]
+    hi = np.clip(np.searchsorted(targets, where), 0, len(targets) - 1)
+    lo = np.clip(hi - 1, 0, len(targets) - 1)
+    lo = np.where(targets[hi] <= where, hi, lo)
+    hi = np.where(where <= targets[lo], lo, hi)
+    span = targets[hi] - targets[lo]
+    t = np.where(span > 0, (where - targets[lo]) / np.where(span > 0, span, 1), 0)
+
+    if where.dtype != float:
+        # No blending -- just the closest.
+        lo = hi = np.where(t > 0.5, hi, lo)
+        t = np.zeros(len(t))
+
+    def formatted(i):
+        return coarse._format(coarse_values[order[i]])
+
+    return {
+        full._format(v): [formatted(l), formatted(h), _numbers([w])[0]]
+        for v, l, h, w in zip(full_values, lo, hi, t)
+    }
+
+
+def _live_render(uid, formatted):
+    """
+    Render the combination of values for live widget uid whose formatted
+    values are `formatted`.  Returns (key, kind, output), with PNGs base64
+    encoded, or None if the widget or values are unknown.
+    """
+    if uid not in _live_widgets:
+        return None
+    f, fixed, lookups, raster = _live_widgets[uid]
+    _live_widgets.move_to_end(uid)
+
+    cache_key = (uid, tuple(formatted))
+    if cache_key in _live_renders:
+        _live_renders.move_to_end(cache_key)
+        return _live_renders[cache_key]
+
+    if len(formatted) != len(lookups):
+        return None
+    try:
+        params = [
+            (param, (lookup[fv], fv)) for (param, lookup), fv in zip(lookups, formatted)
+        ]
+    except (KeyError, TypeError):
+        return None
+
+    with _rendering():
+        key, kind, output, _ = _render(f, fixed, params, raster)
+    if kind in _IMAGE_FORMATS:
+        output = base64.b64encode(output).decode()
+
+    _live_renders[cache_key] = (key, kind, output)
+    while len(_live_renders) > _LIVE_CACHE_SIZE:
+        _live_renders.popitem(last=False)
+    return _live_renders[cache_key]
+
+
+def _live_channel(uid):
+    """
+    The hidden widgets live widget uid talks to the kernel through.  The
+    page writes each request to the Text widget, and the kernel answers by
+    putting the rendered result in the HTML widget, as JSON.
+    """
+    hidden = ipywidgets.Layout(display="none")
+    request = ipywidgets.Text(layout=hidden)
+    response = ipywidgets.HTML(layout=hidden)
+    request.add_class(f"interact-request-{uid}")
+    response.add_class(f"interact-response-{uid}")
+
+    def on_request(change):
         try:
-            Table.max_str_rows = 30
+            values = json.loads(change["new"])["values"]
+        except (ValueError, TypeError, KeyError):
+            return
+        rendered = _live_render(uid, values)
+        if rendered is not None:
+            key, kind, output = rendered
+            message = _inline_json({"key": key, "kind": kind, "output": output})
+            response.value = f'<script type="application/json">{message}</script>'
 
-            (key, html), iheight = precompute(f, fixed, res[0])
-            precomputed = [(key,html)]
+    request.observe(on_request, names="value")
+    return ipywidgets.Box([request, response], layout=hidden)
 
-            num_cores = 1
 
-            with ThreadPoolExecutor(max_workers=num_cores) as executor:
-                futures = [executor.submit(precompute, f, fixed, params) for params in res[1:]]
-                for future in as_completed(futures):
-                    (key, html), height = future.result()
-                    precomputed.append((key, html))
-            return dict(precomputed), iheight
-        finally:
-            Table.max_str_rows = max_str_rows
+def _register_live(uid, f, kwargs, raster):
+    """
+    Keep f, the full-resolution controls in kwargs, and the raster so the
+    kernel can render widget uid on demand.  Returns the widgets to display
+    for the page to talk to the kernel through, or None if there is no
+    kernel.
+    """
+    if not _has_kernel():
+        return None
+
+    fixed = [
+        (param, control._value)
+        for param, control in kwargs.items()
+        if isinstance(control, Fixed)
+    ]
+    lookups = [
+        (param, {control._format(v): v for v in control._values()})
+        for param, control in kwargs.items()
+        if not isinstance(control, Fixed)
+    ]
+
+    _live_widgets[uid] = (f, fixed, lookups, raster)
+    while len(_live_widgets) > _LIVE_MAX_WIDGETS:
+        _live_widgets.popitem(last=False)
+    return _live_channel(uid)
+
 
+def _downsample_to(kwargs, max_choices):
+    """
+    Downsample the controls with the most values until there are at most
+    max_choices combinations, or none can be downsampled further.
+    """
+    while True:
+        items = [len(x._values()) for (_, x) in kwargs.items()]
+        if np.prod(items) <= max_choices:
+            break
+        biggest_key = max(kwargs, key=lambda key: len(kwargs[key]._values()))
+        kwargs[biggest_key]._downsample()
+        if len(kwargs[biggest_key]._values()) == max(items):
+            break
+
+
+def _measure_render(f, kwargs, raster):
+    """
+    Compute and render f for the first value of each control, which is
+    the first combination html_interact computes.  Returns the seconds
+    that took, the size of the output in bytes, and the rendered output.
+    """
+    fixed = [
+        (param, control._value)
+        for param, control in kwargs.items()
+        if isinstance(control, Fixed)
+    ]
+    params = [
+        (param, (control._values()[0], control._format(control._values()[0])))
+        for param, control in kwargs.items()
+        if not isinstance(control, Fixed)
+    ]
+
+    with _rendering():
+        start = time.perf_counter()
+        rendered = _render_all(f, fixed, [params], 1, raster)[0]
+        seconds = time.perf_counter() - start
+
+    _, kind, output, _ = rendered
+    size = len(output if kind in _IMAGE_FORMATS else output.encode())
+    return seconds, size, rendered
+
+
+def _fit_budget(f, kwargs, max_seconds, max_bytes, workers, raster):
+    """
+    Downsample the controls so computing every combination should take
+    under max_seconds and produce under max_bytes, going by the cost of
+    computing the first one.  Either budget may be None.  Prints the grid
+    chosen and its estimated cost if the budgets made it smaller.  Returns
+    the first combination's rendered output, so it isn't computed again.
+    """
+    seconds, size, rendered = _measure_render(f, kwargs, raster)
+    max_choices = np.inf
+    if max_seconds is not None:
+        max_choices = min(max_choices, max_seconds * workers / max(seconds, 1e-6))
+    if max_bytes is not None:
+        max_choices = min(max_choices, max_bytes / max(size, 1))
+
+    def counts():
+        return [
+            (param, len(control._values()))
+            for param, control in kwargs.items()
+            if not isinstance(control, Fixed)
+        ]
+
+    before = counts()
+    _downsample_to(kwargs, max(1, int(max_choices)))
+    after = counts()
+    if after == before:
+        return rendered
+
+    total = int(np.prod([n for _, n in after]))
+    grid = " x ".join(f"{param}={n}" for param, n in after)
+    print(
+        f"html_interact: {grid} = {total} combinations, "
+        f"estimated {total * seconds / min(workers, total):.1f}s and "
+        f"{total * size / 2**10:,.0f} KB "
+        f"(one took {seconds:.3f}s and {size / 2**10:,.1f} KB)"
+    )
+    return rendered
 
 
 def check_parameters(f, kwargs):
@@ -439,9 +1214,96 @@ def make_widgets(f, kwargs):
     return widgets
 
 
-def html_interact(f, max_choices=128, **kwargs):
+def html_interact(
+    f,
+    max_choices=128,
+    workers=1,
+    cache=False,
+    bundle=False,
+    compress=False,
+    sidecar=False,
+    live=False,
+    max_seconds=None,
+    max_bytes=None,
+    image_format="png",
+    image_quality=None,
+    vector=False,
+    **kwargs,
+):
+    """
+    Create an interactive visualization that works without a running
+    kernel, by computing f for every combination of the controls' values
+    ahead of time and embedding the results in the page.  The parameters
+    are the same as for `interact`, plus these optional ones, which f's
+    parameters can't be named after:
+
+    - max_choices: the most combinations of values to compute.  Controls
+                   with too many values are downsampled to stay under it.
+    - workers: the number of processes to compute the combinations in,
+               or None or "auto" for one per core.  Extra processes are
+               forked, which Windows can't do and macOS does unreliably,
+               so leave this at 1 there.
+    - cache: save the results in the images/.cache directory, and reuse
+             the ones saved by earlier runs when f, its data, matplotlib's
+             settings, and the libraries have not changed.  Data f reads
+             from files, or gets from modules other than the notebook, is
+             not checked, so turn this on only when that can't change.
+    - bundle: write all of the plots to a single file that the browser
+              fetches in one request, rather than one file per plot.  The
+              page must then be served over http(s).
+    - compress: gzip the text or html results embedded in the page.
+    - sidecar: write the text or html results to a file in the images
+               directory that the browser fetches, rather than embedding
+               them in the page.  The page must then be served over http(s).
+    - live: keep the controls at full resolution.  Only a downsampled grid
+            and the starting values are computed ahead of time; while the
+            notebook's kernel is running, it computes other combinations
+            as they are chosen.  Without a kernel, or in a frontend that
+            doesn't show ipywidgets, the page shows the closest
+            precomputed result.
+    - max_seconds, max_bytes: budgets for the time to compute and the size
+                              of the results, estimated from computing f
+                              once.  The controls are downsampled to fit,
+                              as well as to max_choices and 32 steps each,
+                              and the grid is printed if the budgets made
+                              it smaller.
+    - image_format: the format for plots: "png", "webp", or "jpeg".  WebP
+                    and JPEG images are smaller, but lossy.
+    - image_quality: the zlib compression level for PNG images, from 0
+                     (fastest) to 9 (smallest), or the quality for WebP and
+                     JPEG images, from 0 to 100.
+    - vector: send the lines, scatter plots, and bars in plots to the
+              browser as numbers, and draw them there, rather than sending
+              images.  The controls keep full resolution, and plots for
+              values between the precomputed ones are blended from their
+              neighbors.  Plots with anything else drawn on them raise a
+              ValueError.
+    """
     uid = uuid()
+
+    # A control for a parameter of f named like an option would be taken
+    #   as the option's value instead.
+    options = list(inspect.signature(html_interact).parameters)[1:-1]
+    clashes = [p for p in inspect.signature(f).parameters if p in options]
+    if clashes:
+        raise ValueError(
+            f"{f.__name__} has parameters named {', '.join(clashes)}, which html_interact uses for its own options.  Rename them to use {f.__name__} with html_interact."
+        )
+
     check_parameters(f, kwargs)
+    workers = _worker_count(workers)
+    raster = _Raster("vector" if vector else image_format, image_quality)
+
+    # Live and vector widgets show the full-resolution controls, but
+    #   precompute a downsampled copy of them.  Fixed values aren't
+    #   downsampled, so they are shared rather than copied, since they may
+    #   be large tables.
+    controls = kwargs
+    if live or vector:
+        kwargs = {
+            param: control if isinstance(control, Fixed) else copy.deepcopy(control)
+            for param, control in kwargs.items()
+        }
 
     # not control gets more than 32 steps
     for (_, x) in kwargs.items():
@@ -450,16 +1312,16 @@ def html_interact(f, max_choices=128, **kwargs):
 
     # total state space < 256
     if max_choices != None:
-        while True:
-            items = [len(x._values()) for (_, x) in kwargs.items()]
-            if np.prod(items) <= max_choices:
-                break
-            biggest_key = max(kwargs, key=lambda key: len(kwargs[key]._values()))
-            kwargs[biggest_key]._downsample()
+        _downsample_to(kwargs, max_choices)
+
+    # The budgets can make the grid smaller still.
+    first = None
+    if max_seconds is not None or max_bytes is not None:
+        first = _fit_budget(f, kwargs, max_seconds, max_bytes, workers, raster)
 
-    htmls = [value._html(param) for (param, value) in kwargs.items()]
-    scripts = [value._script() for (_, value) in kwargs.items()]
-    inputs = [value._input_var() for (_, value) in kwargs.items()]
+    htmls = [value._html(param) for (param, value) in controls.items()]
+    scripts = [value._script() for (_, value) in controls.items()]
+    inputs = [value._input_var() for (_, value) in controls.items()]
 
     full_scripts = "\n".join(scripts)
 
@@ -471,9 +1333,107 @@ def html_interact(f, max_choices=128, **kwargs):
         ]
     )
 
-    data, iheight = _permutations(f, kwargs)
+    extra = []
+    if live or vector:
+        initial = [
+            (param, (control._initial(), control._format(control._initial())))
+            for param, control in controls.items()
+            if not isinstance(control, Fixed)
+        ]
+        extra = [tuple(initial)]
+
+    data, iheight, bundle_filename = _permutations(
+        f, kwargs, workers, cache, bundle, extra, raster, first
+    )
+    values = ", ".join(
+        [
+            f"{control._uid}_value()"
+            for _, control in controls.items()
+            if not isinstance(control, Fixed)
+        ]
+    )
+
+    if iheight and vector:
+        full_html = textwrap.dedent(
+            f"""\
+                    <div>
+                        {"  ".join(htmls)}
+                        <div class="interact-output" id="output_{uid}">
+                        </div>
+                    </div>
+            """
+        )
+
+        # Plots between precomputed ones are blended from the plots at the
+        #   corners of the grid cell around them.
+        updater = textwrap.dedent(
+            f"""\
+            var _output_{uid} = document.getElementById('output_{uid}');
+            var _cache_{uid} = {_data_loader(data, compress, sidecar)};
+            var _figures_{uid} = {{}};
+
+            function figure_{uid}(text) {{
+                if (!(text in _figures_{uid})) {{
+                    _figures_{uid}[text] = _cache_{uid}.then(data => JSON.parse(data.prefix + data.values[data.keys[text]] + data.suffix));
+                }}
+                return _figures_{uid}[text];
+            }}
+
+            function show_{uid}(text) {{
+                figure_{uid}(text).then(figure => {{
+                    _output_{uid}.innerHTML = renderVectorFigure(figure);
+                }});
+            }}
+
+            function approximate_{uid}(values) {{
+                var corners = [[[], 1]];
+                values.forEach((v, i) => {{
+                    var [lo, hi, t] = _brackets_{uid}[i][v];
+                    corners = corners.flatMap(([key, weight]) => t > 0
+                        ? [[key.concat([lo]), weight * (1 - t)], [key.concat([hi]), weight * t]]
+                        : [[key.concat([lo]), weight]]);
+                }});
+                Promise.all(corners.map(([key, _]) => figure_{uid}(createCSVLine(key)))).then(figures => {{
+                    var blended = blendVector(figures, corners.map(([_, weight]) => weight));
+                    _output_{uid}.innerHTML = renderVectorFigure(blended);
+                }});
+            }}
+        """
+        )
+    elif iheight and bundle_filename:
+        full_html = textwrap.dedent(
+            f"""\
+                    <div>
+                        {"  ".join(htmls)}
+                        <div class="interact-output" style="display: flex; align-items: top;">
+                            <img src=""  id="output_{uid}" style="object-fit: contain;"/>
+                        </div>
+                    </div>
+            """
+        )
 
-    if iheight:
+        # One fetch loads every image.  Each is turned into an object URL
+        #   the first time it is shown.
+        updater = textwrap.dedent(
+            f"""\
+            var _img_{uid} = document.getElementById('output_{uid}');
+            var _cache_{uid} = {_inline_json(data)};
+            var _bundle_{uid} = fetch("{bundle_filename}").then(response => response.arrayBuffer());
+            var _urls_{uid} = {{}};
+
+            function show_{uid}(text) {{
+                _bundle_{uid}.then(buffer => {{
+                    var [offset, length] = _cache_{uid}[text];
+                    if (!(offset in _urls_{uid})) {{
+                        var image = new Blob([buffer.slice(offset, offset + length)], {{ type: "image/{image_format}" }});
+                        _urls_{uid}[offset] = URL.createObjectURL(image);
+                    }}
+                    _img_{uid}.src = _urls_{uid}[offset];
+                }});
+            }}
+        """
+        )
+    elif iheight:
         full_html = textwrap.dedent(
             f"""\
                     <div>
@@ -488,19 +1448,11 @@ def html_interact(f, max_choices=128, **kwargs):
         updater = textwrap.dedent(
             f"""\
             var _img_{uid} = document.getElementById('output_{uid}');
-            var _cache_{uid} = {json.dumps(data, indent=2)};
-            var _preloaded_{uid} = false;
+            var _cache_{uid} = {_inline_json(data)};
 
-            function update_{uid}(preload = true) {{
-                var text = createCSVLine([{", ".join([ f"{control._uid}_value()" for _, control in kwargs.items() if not isinstance(control, Fixed)])}]);
+            function show_{uid}(text) {{
                 _img_{uid}.src = _cache_{uid}[text];
-
-                if (preload && false && !_preloaded_{uid}) {{
-                    _preloaded_{uid} = true;
-                    preloadImages([{",".join([ f'"{x}"' for x in data.values() ])}]);
-                }}
-            }} 
-            update_{uid}(preload = false);
+            }}
         """
         )
     else:
@@ -517,66 +1469,86 @@ def html_interact(f, max_choices=128, **kwargs):
         updater = textwrap.dedent(
             f"""\
             var _output_{uid} = document.getElementById('output_{uid}');
-            var _cache_{uid} = {json.dumps(data, indent=2)};
+            var _cache_{uid} = {_data_loader(data, compress, sidecar)};
 
-            function update_{uid}() {{
-                var text = createCSVLine([{", ".join([ f"{control._uid}_value()" for _, control in kwargs.items() if not isinstance(control, Fixed)])}]);
-                console.log(text)
-                _output_{uid}.innerHTML = _cache_{uid}[text];
-            }} 
-            update_{uid}();
+            function show_{uid}(text) {{
+                _cache_{uid}.then(data => {{
+                    _output_{uid}.innerHTML = data.prefix + data.values[data.keys[text]] + data.suffix;
+                }});
+            }}
         """
         )
 
+    channel = None
+    if live or vector:
+        # Show results the kernel renders once they arrive, and an
+        #   approximation from the precomputed ones until then (or forever,
+        #   without a kernel).
+        if live:
+            channel = _register_live(uid, f, controls, raster)
+        brackets = [
+            _bracketing_values(control, kwargs[param])
+            for param, control in controls.items()
+            if not isinstance(control, Fixed)
+        ]
+        if not (iheight and vector):
+            updater += textwrap.dedent(
+                f"""\
+                function approximate_{uid}(values) {{
+                    show_{uid}(createCSVLine(values.map((v, i) => {{
+                        var [lo, hi, t] = _brackets_{uid}[i][v];
+                        return t > 0.5 ? hi : lo;
+                    }})));
+                }}
+            """
+            )
+        opener = (
+            f'openInteractChannel("{uid}", receive_{uid})'
+            if channel is not None
+            else "null"
+        )
+        updater += textwrap.dedent(
+            f"""\
+            var _keys_{uid} = new Set({_inline_json(list(data))});
+            var _brackets_{uid} = {_inline_json(brackets)};
+            var _rendered_{uid} = {{}};
+            var _current_{uid} = null;
+
+            function receive_{uid}(rendered) {{
+                _rendered_{uid}[rendered.key] = rendered;
+                if (rendered.key == _current_{uid}) {{
+                    showLiveOutput(document.getElementById('output_{uid}'), rendered);
+                }}
+            }}
+            var _channel_{uid} = {opener};
 
-        # if iheight:
-        #     preload = f"""
-        #         <div class="hidden">
-        #             <script type="text/javascript">
-        #                 document.addEventListener('DOMContentLoaded', function() {{
-        #                     async function preloadImages(imageUrls) {{
-        #                         const imageLoadPromises = imageUrls.map(url => {{
-        #                             return new Promise((resolve, reject) => {{
-        #                                 const img = new Image();
-        #                                 img.onload = () => resolve(img);
-        #                                 img.onerror = reject;
-        #                                 img.src = url;
-        #                             }});
-        #                         }});
-
-        #                         Promise.all(imageLoadPromises)
-        #                             .then(() => console.log("All images loaded successfully!"))
-        #                             .catch(error => console.error("Error loading some images:", error));
-        #                     }}
-        #                     preloadImages([{",".join([ f'"{x}"' for x in data.values() ])}]);
-        #                 }});
-        #             </script>
-                    
-        #         </div>
-        #         """
-            
-        #     preload = f"""
-        #         <div class="hidden">
-        #                     async function preloadImages(imageUrls) {{
-        #                         const imageLoadPromises = imageUrls.map(url => {{
-        #                             return new Promise((resolve, reject) => {{
-        #                                 const img = new Image();
-        #                                 img.onload = () => resolve(img);
-        #                                 img.onerror = reject;
-        #                                 img.src = url;
-        #                             }});
-        #                         }});
-
-        #                         Promise.all(imageLoadPromises)
-        #                             .then(() => console.log("All images loaded successfully!"))
-        #                             .catch(error => console.error("Error loading some images:", error));
-        #                     }}
-        #                     preloadImages([{",".join([ f'"{x}"' for x in data.values() ])}]);
-        #         </div>
-        #         """
-
-        # else:
-    preload = ""
+            function update_{uid}() {{
+                var values = [{values}].map(String);
+                var text = createCSVLine(values);
+                _current_{uid} = text;
+                if (_keys_{uid}.has(text)) {{
+                    show_{uid}(text);
+                }} else if (text in _rendered_{uid}) {{
+                    showLiveOutput(document.getElementById('output_{uid}'), _rendered_{uid}[text]);
+                }} else {{
+                    approximate_{uid}(values);
+                    if (_channel_{uid}) {{
+                        _channel_{uid}.send(values);
+                    }}
+                }}
+            }}
+            update_{uid}();
+        """
+        )
+    else:
+        updater += textwrap.dedent(
+            f"""\
+            function update_{uid}() {{
+                show_{uid}(createCSVLine([{values}]));
+            }}
+            update_{uid}();
+        """
+        )
 
     display(HTML(
         textwrap.dedent(
@@ -586,21 +1558,151 @@ def html_interact(f, max_choices=128, **kwargs):
         <script>
         {full_scripts}
 
-        async function preloadImages(imageUrls) {{
-            const imageLoadPromises = imageUrls.map(url => {{
-                return new Promise((resolve, reject) => {{
-                    const img = new Image();
-                    img.onload = () => resolve(img);
-                    img.onerror = reject;
-                    img.src = url;
+        async function decompressInteractData(response) {{
+            const body = (await response).body.pipeThrough(new DecompressionStream("gzip"));
+            return JSON.parse(await new Response(body).text());
+        }}
+
+        function openInteractChannel(uid, onRendered) {{
+            // The kernel's side is a pair of hidden ipywidgets shown after
+            //   this output.  They may not be drawn yet, so look them up
+            //   each time, and send nothing if they never are.
+            var sent = 0;
+            var observed = null;
+            return {{
+                send: function(values) {{
+                    var response = document.querySelector(".interact-response-" + uid);
+                    var request = document.querySelector(".interact-request-" + uid + " input");
+                    if (!response || !request) {{
+                        return;
+                    }}
+                    if (observed !== response) {{
+                        observed = response;
+                        new MutationObserver(() => {{
+                            var message = response.querySelector('script[type="application/json"]');
+                            if (message) {{
+                                onRendered(JSON.parse(message.textContent));
+                            }}
+                        }}).observe(response, {{childList: true, subtree: true, characterData: true}});
+                    }}
+                    // Number the requests so repeating one still changes the value.
+                    request.value = JSON.stringify({{n: ++sent, values: values}});
+                    request.dispatchEvent(new Event("change", {{bubbles: true}}));
+                }}
+            }};
+        }}
+
+        function showLiveOutput(output, rendered) {{
+            if (rendered.kind == "vector") {{
+                output.innerHTML = renderVectorFigure(JSON.parse(rendered.output));
+            }} else if (rendered.kind != "html") {{
+                output.src = "data:image/" + rendered.kind + ";base64," + rendered.output;
+            }} else {{
+                output.innerHTML = rendered.output;
+            }}
+        }}
+
+        function blendVector(values, weights) {{
+            // Weighted average of figures with the same structure.  Anything that
+            //   differs between them comes from the most heavily weighted one.
+            var nearest = values[weights.indexOf(Math.max(...weights))];
+            if (values.every(v => typeof v === "number")) {{
+                return values.reduce((sum, v, i) => sum + v * weights[i], 0);
+            }}
+            if (values.every(v => Array.isArray(v) && v.length == nearest.length)) {{
+                return nearest.map((_, j) => blendVector(values.map(v => v[j]), weights));
+            }}
+            if (values.every(v => v && typeof v === "object" && !Array.isArray(v))) {{
+                var blended = {{}};
+                for (var key in nearest) {{
+                    blended[key] = values.every(v => key in v) ? blendVector(values.map(v => v[key]), weights) : nearest[key];
+                }}
+                return blended;
+            }}
+            return nearest;
+        }}
+
+        function renderVectorFigure(figure) {{
+            var escape = s => String(s).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;");
+            var points = figure.dpi / 72;
+            var dashes = {{"--": [3.7, 1.6], "-.": [6.4, 1.6, 1, 1.6], ":": [1, 1.65]}};
+            var svg = [`<svg xmlns="http://www.w3.org/2000/svg" width="${{figure.width}}" height="${{figure.height}}" font-family="sans-serif">`];
+            svg.push(`<rect width="${{figure.width}}" height="${{figure.height}}" fill="white"/>`);
+
+            figure.axes.forEach((ax, n) => {{
+                var [x0, y0, w, h] = ax.bounds;
+                var left = x0 * figure.width, top = (1 - y0 - h) * figure.height;
+                var width = w * figure.width, height = h * figure.height;
+                var sx = x => left + (x - ax.xlim[0]) / (ax.xlim[1] - ax.xlim[0]) * width;
+                var sy = y => top + height - (y - ax.ylim[0]) / (ax.ylim[1] - ax.ylim[0]) * height;
+                var font = ax.fontsize * points;
+                var clip = "clip" + Math.random().toString(36).slice(2);
+
+                svg.push(`<clipPath id="${{clip}}"><rect x="${{left}}" y="${{top}}" width="${{width}}" height="${{height}}"/></clipPath>`);
+                svg.push(`<g clip-path="url(#${{clip}})">`);
+                ax.bars.forEach(b => {{
+                    var xs = [sx(b.x), sx(b.x + b.w)], ys = [sy(b.y), sy(b.y + b.h)];
+                    svg.push(`<rect x="${{Math.min(...xs)}}" y="${{Math.min(...ys)}}" width="${{Math.abs(xs[1] - xs[0])}}" height="${{Math.abs(ys[1] - ys[0])}}" fill="${{b.color}}" fill-opacity="${{b.alpha}}" stroke="${{b.edge}}" stroke-width="${{b.width * points}}"/>`);
+                }});
+                ax.lines.forEach(line => {{
+                    var d = "", pen = "M";
+                    line.x.forEach((x, i) => {{
+                        var y = line.y[i];
+                        if (x === null || y === null) {{
+                            pen = "M";
+                        }} else {{
+                            d += `${{pen}}${{sx(x).toFixed(1)}},${{sy(y).toFixed(1)}}`;
+                            pen = "L";
+                        }}
+                    }});
+                    if (line.style in dashes || line.style == "-") {{
+                        var dash = (dashes[line.style] || []).map(x => x * line.width * points).join(",");
+                        svg.push(`<path d="${{d}}" fill="none" stroke="${{line.color}}" stroke-opacity="${{line.alpha}}" stroke-width="${{line.width * points}}" stroke-dasharray="${{dash}}"/>`);
+                    }}
+                    if (line.marker) {{
+                        var r = line.size * points / 2;
+                        line.x.forEach((x, i) => {{
+                            if (x !== null && line.y[i] !== null) {{
+                                svg.push(line.marker == "s"
+                                    ? `<rect x="${{sx(x) - r}}" y="${{sy(line.y[i]) - r}}" width="${{2 * r}}" height="${{2 * r}}" fill="${{line.fill}}" fill-opacity="${{line.alpha}}"/>`
+                                    : `<circle cx="${{sx(x)}}" cy="${{sy(line.y[i])}}" r="${{line.marker == "." ? r / 2 : r}}" fill="${{line.fill}}" fill-opacity="${{line.alpha}}"/>`);
+                            }}
+                        }});
+                    }}
+                }});
+                ax.points.forEach(p => {{
+                    p.x.forEach((x, i) => {{
+                        if (x !== null && p.y[i] !== null) {{
+                            var size = p.sizes[i % p.sizes.length], c = i % p.colors.length;
+                            svg.push(`<circle cx="${{sx(x)}}" cy="${{sy(p.y[i])}}" r="${{Math.sqrt(size) * points / 2}}" fill="${{p.colors[c]}}" fill-opacity="${{p.alphas[c]}}"/>`);
+                        }}
+                    }});
+                }});
+                svg.push(`</g>`);
+
+                svg.push(`<rect x="${{left}}" y="${{top}}" width="${{width}}" height="${{height}}" fill="none" stroke="black" stroke-width="${{0.8 * points}}"/>`);
+                ax.xticks.at.forEach((x, i) => {{
+                    svg.push(`<line x1="${{sx(x)}}" x2="${{sx(x)}}" y1="${{top + height}}" y2="${{top + height + 3.5 * points}}" stroke="black"/>`);
+                    svg.push(`<text x="${{sx(x)}}" y="${{top + height + 3.5 * points + font}}" font-size="${{font}}" text-anchor="middle">${{escape(ax.xticks.labels[i])}}</text>`);
+                }});
+                ax.yticks.at.forEach((y, i) => {{
+                    svg.push(`<line x1="${{left - 3.5 * points}}" x2="${{left}}" y1="${{sy(y)}}" y2="${{sy(y)}}" stroke="black"/>`);
+                    svg.push(`<text x="${{left - 5 * points}}" y="${{sy(y)}}" font-size="${{font}}" text-anchor="end" dominant-baseline="middle">${{escape(ax.yticks.labels[i])}}</text>`);
+                }});
+                svg.push(`<text x="${{left + width / 2}}" y="${{top - font / 2}}" font-size="${{1.2 * font}}" text-anchor="middle">${{escape(ax.title)}}</text>`);
+                svg.push(`<text x="${{left + width / 2}}" y="${{top + height + 3.5 * points + 2.5 * font}}" font-size="${{font}}" text-anchor="middle">${{escape(ax.xlabel)}}</text>`);
+                svg.push(`<text transform="translate(${{left - 3.5 * font}}, ${{top + height / 2}}) rotate(-90)" font-size="${{font}}" text-anchor="middle">${{escape(ax.ylabel)}}</text>`);
+                ax.legend.forEach((entry, i) => {{
+                    var y = top + (i + 1) * 1.5 * font;
+                    svg.push(`<rect x="${{left + width - 8 * font}}" y="${{y - font / 2}}" width="${{font}}" height="${{font / 2}}" fill="${{entry.color}}"/>`);
+                    svg.push(`<text x="${{left + width - 6.5 * font}}" y="${{y}}" font-size="${{font}}">${{escape(entry.label)}}</text>`);
                 }});
             }});
 
-            Promise.all(imageLoadPromises)
-                .then(() => console.log("All images loaded successfully!"))
-                .catch(error => console.error("Error loading some images:", error));
+            svg.push("</svg>");
+            return svg.join("");
         }}
-        
+
         function createCSVLine(values) {{
             return values.map(value => {{
                 let stringValue = ""
@@ -622,10 +1724,11 @@ def html_interact(f, max_choices=128, **kwargs):
         {updater}
         {listeners}
         </script>
-        {preload}
     """
         )
     ))
+    if channel is not None:
+        display(channel)
 
 
 @doc_tag("interact")